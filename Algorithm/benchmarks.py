@@ -0,0 +1,49 @@
+"""Micro-benchmarks for the graph engine in main.py.
+
+Run with:  python Algorithm/benchmarks.py
+"""
+import time
+import tracemalloc
+
+from main import Edge, Node, Graph, GraphRunConfig, VALUE_MODES
+
+
+def build_fan_out_graph(width: int, depth: int) -> Graph:
+    """A root feeding `width` chains of length `depth`, every edge carrying a
+    list and a dict value."""
+    root = Node(node_id="root", data={"rows": [], "meta": {}})
+    nodes = [root]
+    for branch in range(width):
+        parent = root
+        for level in range(depth):
+            child = Node(node_id=f"n{branch}_{level}", data={"rows": [], "meta": {}})
+            edge = Edge(src_node=parent.node_id, dst_node=child.node_id,
+                        src_to_dst_data_keys={"rows": "rows", "meta": "meta"})
+            parent.paths_out.append(edge)
+            child.paths_in.append(edge)
+            nodes.append(child)
+            parent = child
+    return Graph(nodes=nodes)
+
+
+def bench_value_modes(width: int = 100, depth: int = 5, rows: int = 500):
+    """Peak allocations and wall time of one run per value mode."""
+    print(f"fan-out graph: width={width} depth={depth} rows={rows}")
+    for mode in VALUE_MODES:
+        graph = build_fan_out_graph(width, depth)
+        root_inputs = {"root": {
+            "rows": [{"id": i, "value": float(i)} for i in range(rows)],
+            "meta": {"source": "bench", "columns": ["id", "value"]},
+        }}
+        config = GraphRunConfig(root_inputs=root_inputs, value_mode=mode)
+        tracemalloc.start()
+        start = time.perf_counter()
+        graph.run(config)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {mode:<7} peak={peak / 1024:>10.1f} KiB  time={elapsed * 1000:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    bench_value_modes()
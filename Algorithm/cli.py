@@ -0,0 +1,138 @@
+"""Batch runner for graph files, without Django.
+
+Run with:  python Algorithm/cli.py graphs/ --config run.json --jobs 8 --output results.ndjson
+
+Each input is a JSON graph file (directories are expanded to the *.json files
+they contain):
+
+    {
+        "nodes": [{"node_id": "A", "data": {"x": 1}, "outputs": {"x": "int"}},
+                  {"node_id": "B", "data": {"y": 0}}],
+        "edges": [{"src_node": "A", "dst_node": "B", "src_to_dst_data_keys": {"x": "y"}}],
+        "run": {"root_inputs": {"A": {"x": 5}}}
+    }
+
+"run" holds GraphRunConfig options; keys from --config override it. One
+NDJSON line is written per file, in input order, with the run's status, the
+data of every node and the time it took. The exit status is 1 if any run did
+not succeed.
+"""
+import argparse
+import os
+import sys
+
+RUN_OPTIONS = ("root_inputs", "data_overwrites", "enable_list", "disable_list", "include_dependencies",
+               "value_mode", "validate_inputs", "timeout", "node_timeout")
+
+# Run options shared by every file, set once per worker process
+_overrides = {}
+
+
+def _init_worker(overrides):
+    global _overrides
+    _overrides = overrides
+
+
+def load_graph(definition):
+    """Build a Graph from the "nodes"/"edges" of a graph file."""
+    from main import Edge, Graph, Node
+
+    nodes = {}
+    for spec in definition["nodes"]:
+        node = Node(node_id=spec["node_id"], data=spec.get("data"),
+                    inputs=spec.get("inputs"), outputs=spec.get("outputs"))
+        nodes[node.node_id] = node
+    for spec in definition.get("edges", []):
+        edge = Edge(src_node=spec["src_node"], dst_node=spec["dst_node"],
+                    src_to_dst_data_keys=spec.get("src_to_dst_data_keys"))
+        if edge.src_node not in nodes:
+            raise ValueError(f"Node {edge.src_node} does not exist in the graph")
+        nodes[edge.src_node].paths_out.append(edge)
+        if edge.dst_node in nodes:
+            nodes[edge.dst_node].paths_in.append(edge)
+    return Graph(nodes=list(nodes.values()))
+
+
+def run_file(path):
+    """Run one graph file and return (succeeded, NDJSON line)."""
+    import json
+    import time
+    from main import GraphRunConfig
+
+    started = time.perf_counter()
+    result = {"file": path}
+    try:
+        with open(path) as f:
+            definition = json.load(f)
+        graph = load_graph(definition)
+        options = {**definition.get("run", {}), **_overrides}
+        unknown = set(options) - set(RUN_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown run options: {', '.join(sorted(unknown))}")
+        result["run_id"] = graph.run(GraphRunConfig(**options))
+        result["status"] = "succeeded"
+        result["outputs"] = {node_id: node.data for node_id, node in graph.nodes.items()}
+    except TimeoutError as e:
+        result.update(status="timed_out", error=str(e))
+    except Exception as e:
+        # Any error is reported against its file; one bad input must not stop the batch
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    return result["status"] == "succeeded", json.dumps(result)
+
+
+def iter_inputs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".json"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def write_results(results, out) -> int:
+    """Write NDJSON lines as they arrive; return the number of failed runs."""
+    failures = 0
+    for succeeded, line in results:
+        out.write(line + "\n")
+        failures += not succeeded
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run graph files and write their outputs as NDJSON.")
+    parser.add_argument("inputs", nargs="+", help="Graph files or directories of *.json graph files")
+    parser.add_argument("--config", help="JSON file of run options applied to every graph")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count; 1 runs in this process)")
+    parser.add_argument("--output", help="Write NDJSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    if args.config:
+        import json
+        with open(args.config) as f:
+            overrides = json.load(f)
+    paths = list(iter_inputs(args.inputs))
+    jobs = max(1, min(args.jobs, len(paths)))
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if jobs == 1:
+            _init_worker(overrides)
+            failures = write_results(map(run_file, paths), out)
+        else:
+            from multiprocessing import Pool
+            with Pool(jobs, initializer=_init_worker, initargs=(overrides,)) as pool:
+                # Batches of files per task keep IPC overhead low for small graphs
+                chunksize = max(1, len(paths) // (jobs * 4))
+                failures = write_results(pool.imap(run_file, paths, chunksize), out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
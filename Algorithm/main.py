@@ -1,10 +1,107 @@
-from typing import List, Dict, Union, Optional
+from typing import Iterator, List, Dict, Set, Union, Optional
 from collections import deque
+import copy
+import threading
+import time
 import uuid
 
 # Define types for data
 DataType = Union[int, float, str, bool, list, dict]
 
+# Types a port schema may declare, by the name used in JSON definitions
+PORT_TYPES = {"int": int, "float": float, "str": str, "bool": bool, "list": list, "dict": dict}
+
+# How propagated values are passed along edges: "alias" shares the source
+# object, "copy" deep-copies it per edge and "frozen" freezes containers once
+# at ingestion so they can be shared by reference safely.
+VALUE_MODES = ("alias", "copy", "frozen")
+
+class FrozenDict(dict):
+    """Immutable dict. Use set()/delete() to derive a modified copy that
+    shares every other value with the original."""
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("FrozenDict is immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self.items()))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def set(self, key, value) -> "FrozenDict":
+        items = dict(self)
+        items[key] = freeze(value)
+        return FrozenDict(items)
+
+    def delete(self, key) -> "FrozenDict":
+        items = dict(self)
+        del items[key]
+        return FrozenDict(items)
+
+class FrozenList(list):
+    """Immutable list. Use set() to derive a modified copy."""
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("FrozenList is immutable")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = remove = pop = clear = sort = reverse = _immutable
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+    def set(self, index: int, value) -> "FrozenList":
+        items = list(self)
+        items[index] = freeze(value)
+        return FrozenList(items)
+
+def freeze(value: DataType) -> DataType:
+    """Recursively convert lists and dicts into their frozen counterparts.
+    Values that are already frozen are returned as-is."""
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return FrozenList([freeze(item) for item in value])
+    return value
+
+def value_type(value: DataType) -> type:
+    if isinstance(value, FrozenDict):
+        return dict
+    if isinstance(value, FrozenList):
+        return list
+    return type(value)
+
+def accepts_type(expected: type, actual: type) -> bool:
+    # ints are accepted where floats are expected, as JSON does not tell them apart
+    return expected is actual or (expected is float and actual is int)
+
+def thaw(value: DataType) -> DataType:
+    """Return a mutable deep copy of a (possibly frozen) value."""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
 class Edge:
     def __init__(self, src_node: str, dst_node: str, src_to_dst_data_keys: Dict[str, str] = None):
         self.src_node = src_node
@@ -12,27 +109,203 @@ class Edge:
         self.src_to_dst_data_keys = src_to_dst_data_keys or {}
 
 class Node:
-    def __init__(self, node_id: str, data: Dict[str, DataType] = None):
+    def __init__(self, node_id: str, data: Dict[str, DataType] = None,
+                 inputs: Dict[str, Union[type, str]] = None,
+                 outputs: Dict[str, Union[type, str]] = None):
         self.node_id = node_id
         self.data = data or {}
+        # Declared port schemas: data key -> type (or its name in PORT_TYPES)
+        self.inputs = inputs or {}
+        self.outputs = outputs or {}
         self.paths_in: List[Edge] = []
         self.paths_out: List[Edge] = []
 
+class RunCancelled(Exception):
+    """Raised inside a run that was cancelled through GraphRunConfig.cancel()."""
+
 class GraphRunConfig:
     def __init__(self, root_inputs: Dict[str, Dict[str, DataType]] = None, 
                  data_overwrites: Dict[str, Dict[str, DataType]] = None,
                  enable_list: Optional[List[str]] = None,
-                 disable_list: Optional[List[str]] = None):
+                 disable_list: Optional[List[str]] = None,
+                 include_dependencies: bool = False,
+                 value_mode: str = "alias",
+                 validate_inputs: bool = False,
+                 timeout: Optional[float] = None,
+                 node_timeout: Optional[float] = None):
         self.root_inputs = root_inputs or {}
         self.data_overwrites = data_overwrites or {}
         self.enable_list = enable_list
         self.disable_list = disable_list
+        # When set, every ancestor of a node in enable_list is enabled as well
+        self.include_dependencies = include_dependencies
+        self.value_mode = value_mode
+        # Check root inputs and overwrites against the declared port types
+        self.validate_inputs = validate_inputs
+        # Seconds the whole run, and each node, may take. Both are checked
+        # cooperatively between nodes and raise TimeoutError; a cancelled or
+        # timed-out run leaves node data as it was before the run.
+        self.timeout = timeout
+        self.node_timeout = node_timeout
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop a run using this config at its next node boundary."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+class RunStats:
+    """Process-wide run counters, updated by Graph.run and readable in the
+    Prometheus text format through to_prometheus()."""
+    OUTCOMES = ("succeeded", "failed", "cancelled", "timed_out")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.runs = {outcome: 0 for outcome in self.OUTCOMES}
+            self.run_seconds = 0.0
+            self.nodes_processed = 0
+            self.max_graph_nodes = 0
+
+    def record(self, outcome: str, seconds: float, nodes: int, graph_nodes: int):
+        with self._lock:
+            self.runs[outcome] += 1
+            self.run_seconds += seconds
+            self.nodes_processed += nodes
+            self.max_graph_nodes = max(self.max_graph_nodes, graph_nodes)
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            lines = ["# TYPE graph_runs_total counter"]
+            lines += [f'graph_runs_total{{outcome="{outcome}"}} {count}' for outcome, count in self.runs.items()]
+            lines += [
+                "# TYPE graph_run_seconds_total counter", f"graph_run_seconds_total {self.run_seconds}",
+                "# TYPE graph_nodes_processed_total counter", f"graph_nodes_processed_total {self.nodes_processed}",
+                "# TYPE graph_max_nodes gauge", f"graph_max_nodes {self.max_graph_nodes}",
+            ]
+        return "\n".join(lines) + "\n"
+
+run_stats = RunStats()
+
+class ReachabilityIndex:
+    """Answers ancestor/descendant queries on an acyclic graph.
+
+    Nodes are labelled with their topological position and with a pre/post
+    interval from a DFS spanning forest. The topological position rules out
+    most negative queries and the interval confirms tree paths; anything
+    else falls back to a per-node descendant bitset.
+    """
+    def __init__(self, nodes: Dict[str, Node], order: List[str]):
+        self._order = order
+        self._position = {node_id: i for i, node_id in enumerate(order)}
+        size = len(order)
+        self._descendants = [0] * size
+        self._ancestors = [0] * size
+        for i in range(size - 1, -1, -1):
+            for edge in nodes[order[i]].paths_out:
+                j = self._position.get(edge.dst_node)
+                if j is not None:
+                    self._descendants[i] |= self._descendants[j] | (1 << j)
+        for i in range(size):
+            for edge in nodes[order[i]].paths_out:
+                j = self._position.get(edge.dst_node)
+                if j is not None:
+                    self._ancestors[j] |= self._ancestors[i] | (1 << i)
+        self._pre = [0] * size
+        self._post = [0] * size
+        self._label_intervals(nodes)
+
+    def _label_intervals(self, nodes: Dict[str, Node]):
+        visited = [False] * len(self._order)
+        counter = 0
+        for root in range(len(self._order)):
+            if visited[root]:
+                continue
+            visited[root] = True
+            self._pre[root] = counter
+            counter += 1
+            stack = [(root, iter(nodes[self._order[root]].paths_out))]
+            while stack:
+                i, edges = stack[-1]
+                for edge in edges:
+                    j = self._position.get(edge.dst_node)
+                    if j is not None and not visited[j]:
+                        visited[j] = True
+                        self._pre[j] = counter
+                        counter += 1
+                        stack.append((j, iter(nodes[edge.dst_node].paths_out)))
+                        break
+                else:
+                    stack.pop()
+                    self._post[i] = counter
+                    counter += 1
+
+    def _index(self, node_id: str) -> int:
+        try:
+            return self._position[node_id]
+        except KeyError:
+            raise ValueError(f"Node {node_id} not found in the graph")
+
+    def _decode(self, bits: int) -> Set[str]:
+        result = set()
+        while bits:
+            low = bits & -bits
+            result.add(self._order[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def reaches(self, src_node: str, dst_node: str) -> bool:
+        """Return True if there is a non-empty path from src_node to dst_node."""
+        i, j = self._index(src_node), self._index(dst_node)
+        if i >= j:
+            return False
+        if self._pre[i] < self._pre[j] and self._post[j] < self._post[i]:
+            return True
+        return bool(self._descendants[i] >> j & 1)
+
+    def descendants(self, node_id: str) -> Set[str]:
+        return self._decode(self._descendants[self._index(node_id)])
+
+    def ancestors(self, node_id: str) -> Set[str]:
+        return self._decode(self._ancestors[self._index(node_id)])
 
 class Graph:
     def __init__(self, nodes: List[Node]):
         self.nodes = {node.node_id: node for node in nodes}
+        self._reachability: Optional[ReachabilityIndex] = None
+        self._port_types = self._compile_port_types()
         self._validate_graph_structure()
 
+    def _compile_port_types(self) -> Dict[str, Dict[str, type]]:
+        port_types = {}
+        for node in self.nodes.values():
+            ports = {}
+            for key, port_type in list(node.inputs.items()) + list(node.outputs.items()):
+                if isinstance(port_type, str):
+                    if port_type not in PORT_TYPES:
+                        raise ValueError(f"Unknown port type {port_type} for {node.node_id}.{key}")
+                    port_type = PORT_TYPES[port_type]
+                if ports.setdefault(key, port_type) is not port_type:
+                    raise ValueError(f"Conflicting port types for {node.node_id}.{key}")
+            if ports:
+                port_types[node.node_id] = ports
+        return port_types
+
+    def _port_type(self, node: Node, key: str) -> Optional[type]:
+        # Declared ports win; otherwise fall back to the type of a sample value
+        declared = self._port_types.get(node.node_id, {}).get(key)
+        if declared is not None:
+            return declared
+        if key in node.data:
+            return value_type(node.data[key])
+        return None
+
     def _validate_graph_structure(self):
         if len(self.nodes) != len(set(node.node_id for node in self.nodes.values())):
             raise ValueError("Duplicate node IDs found in graph")
@@ -44,11 +317,10 @@ class Graph:
                     raise ValueError(f"Node {edge.dst_node} does not exist in the graph")
                 
                 for src_key, dst_key in edge.src_to_dst_data_keys.items():
-                    if src_key in node.data and dst_key in dst_node.data:
-                        # print("type(node.data[src_key])", type(node.data[src_key]));
-                        # print("type(dst_node.data[dst_key])", type(dst_node.data[dst_key]));
-                        if type(dst_node.data[dst_key])==None or type(node.data[src_key]) != type(dst_node.data[dst_key]):
-                            raise ValueError(f"Incompatible data types for {src_key} -> {dst_key}")
+                    src_type = self._port_type(node, src_key)
+                    dst_type = self._port_type(dst_node, dst_key)
+                    if src_type is not None and dst_type is not None and not accepts_type(dst_type, src_type):
+                        raise ValueError(f"Incompatible data types for {src_key} -> {dst_key}")
 
             outgoing_edges = {(e.src_node, e.dst_node): e for e in node.paths_out}
             if len(outgoing_edges) != len(node.paths_out):
@@ -76,24 +348,99 @@ class Graph:
                 if dfs(node_id):
                     raise ValueError("Cycle detected in the graph")
 
+    def get_reachability_index(self) -> ReachabilityIndex:
+        if self._reachability is None:
+            self._detect_cycle()
+            order = [node_id for level in self.toposort(self.nodes) for node_id in level]
+            self._reachability = ReachabilityIndex(self.nodes, order)
+        return self._reachability
+
     def run(self, config: GraphRunConfig):
+        run_id = str(uuid.uuid4())
+        started = time.monotonic()
+        processed, outcome = 0, "failed"
+        try:
+            for level in self.iter_run(config):
+                processed += len(level)
+            outcome = "succeeded"
+        except RunCancelled:
+            outcome = "cancelled"
+            raise
+        except TimeoutError:
+            outcome = "timed_out"
+            raise
+        finally:
+            run_stats.record(outcome, time.monotonic() - started, processed, len(self.nodes))
+        return run_id
+
+    def iter_run(self, config: GraphRunConfig) -> Iterator[Dict[str, Dict[str, DataType]]]:
+        """Run the graph, yielding one {node_id: data} batch per topological
+        level as soon as every node in that level has received all its inputs.
+        The run only advances while the generator is consumed."""
+        deadline = time.monotonic() + config.timeout if config.timeout is not None else None
         self._validate_config(config)
         self._detect_cycle()
-        run_id = str(uuid.uuid4())
-        
+
         enabled_nodes = self._get_enabled_nodes(config)
-        self._populate_root_inputs(config, enabled_nodes)
-        self._propagate_data(enabled_nodes, config)
+        # Node data as it was before the run, restored if the run is aborted
+        saved = [(node, node.data, dict(node.data)) for node in enabled_nodes.values()]
+        for node in enabled_nodes.values():
+            # Each run works on its own top-level dicts, so freezing never
+            # reaches the dicts callers hold, and values frozen by an earlier
+            # frozen run are handed to other modes as mutable copies
+            if config.value_mode == "frozen":
+                node.data = {key: freeze(value) for key, value in node.data.items()}
+            elif any(isinstance(value, (FrozenDict, FrozenList)) for value in node.data.values()):
+                node.data = {key: thaw(value) if isinstance(value, (FrozenDict, FrozenList)) else value
+                             for key, value in node.data.items()}
+        try:
+            self._populate_root_inputs(config, enabled_nodes)
+            yield from self._propagate_data(enabled_nodes, config, deadline)
+        except (RunCancelled, TimeoutError):
+            # Drop the partial results, including those of a node that ran
+            # past node_timeout after writing downstream
+            for node, data, snapshot in saved:
+                data.clear()
+                data.update(snapshot)
+                node.data = data
+            raise
 
-        return run_id
+    def _check_run(self, config: GraphRunConfig, deadline: Optional[float]):
+        if config.cancelled:
+            raise RunCancelled("Run was cancelled")
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"Run exceeded its timeout of {config.timeout}s")
 
     def _validate_config(self, config: GraphRunConfig):
         if config.enable_list and config.disable_list:
             raise ValueError("Cannot provide both enable_list and disable_list")
+        if config.value_mode not in VALUE_MODES:
+            raise ValueError(f"Unknown value mode {config.value_mode}")
+        if config.validate_inputs:
+            for values in (config.root_inputs, config.data_overwrites):
+                for node_id, data in values.items():
+                    self._validate_port_values(node_id, data)
+
+    def _validate_port_values(self, node_id: str, data: Dict[str, DataType]):
+        ports = self._port_types.get(node_id)
+        if not ports:
+            return
+        for key, value in data.items():
+            expected = ports.get(key)
+            if expected is not None and not accepts_type(expected, value_type(value)):
+                raise ValueError(f"Invalid type for {node_id}.{key}: expected {expected.__name__}, "
+                                 f"got {value_type(value).__name__}")
 
     def _get_enabled_nodes(self, config: GraphRunConfig):
         if config.enable_list:
-            return {node_id: self.nodes[node_id] for node_id in config.enable_list if node_id in self.nodes}
+            enable_list = [node_id for node_id in config.enable_list if node_id in self.nodes]
+            if config.include_dependencies:
+                index = self.get_reachability_index()
+                dependencies = set()
+                for node_id in enable_list:
+                    dependencies |= index.ancestors(node_id)
+                enable_list += [node_id for node_id in self.nodes if node_id in dependencies]
+            return {node_id: self.nodes[node_id] for node_id in enable_list}
         elif config.disable_list:
             return {node_id: self.nodes[node_id] for node_id in self.nodes if node_id not in config.disable_list}
         else:
@@ -102,9 +449,15 @@ class Graph:
     def _populate_root_inputs(self, config: GraphRunConfig, enabled_nodes: Dict[str, Node]):
         for node_id, data in config.root_inputs.items():
             if node_id in enabled_nodes:
-                enabled_nodes[node_id].data.update(data)
+                enabled_nodes[node_id].data.update(self._ingest(config, data))
 
-    def _propagate_data(self, enabled_nodes: Dict[str, Node], config: GraphRunConfig):
+    def _ingest(self, config: GraphRunConfig, data: Dict[str, DataType]) -> Dict[str, DataType]:
+        if config.value_mode == "frozen":
+            return {key: freeze(value) for key, value in data.items()}
+        return data
+
+    def _propagate_data(self, enabled_nodes: Dict[str, Node], config: GraphRunConfig,
+                        deadline: Optional[float] = None):
         levels = self.toposort(enabled_nodes)
         # print("levels", levels)
         # print data in all nodes
@@ -112,18 +465,28 @@ class Graph:
             for node_id in level:
                 node = enabled_nodes[node_id]
                 if node_id in config.data_overwrites:
-                    node.data.update(config.data_overwrites[node_id])
+                    node.data.update(self._ingest(config, config.data_overwrites[node_id]))
         # for node in enabled_nodes.values():
         #     print("node.data", node.data)
         for level in levels:
+            self._check_run(config, deadline)
+            # Every predecessor of this level has pushed its data already
+            yield {node_id: enabled_nodes[node_id].data for node_id in level}
             for node_id in level:
+                self._check_run(config, deadline)
                 node = enabled_nodes[node_id]
+                started = time.monotonic()
 
                 for edge in node.paths_out:
                     dst_node = enabled_nodes.get(edge.dst_node)
                     if dst_node:
                         for src_key, dst_key in edge.src_to_dst_data_keys.items():
-                            dst_node.data[dst_key] = node.data[src_key]
+                            value = node.data[src_key]
+                            if config.value_mode == "copy":
+                                value = copy.deepcopy(value)
+                            dst_node.data[dst_key] = value
+                if config.node_timeout is not None and time.monotonic() - started > config.node_timeout:
+                    raise TimeoutError(f"Node {node_id} exceeded its timeout of {config.node_timeout}s")
 
     def toposort(self, enabled_nodes: Dict[str, Node]):
         in_degree = {node_id: 0 for node_id in enabled_nodes}
@@ -421,6 +784,251 @@ def test_with_duplicate_edges():
         assert str(e) == "Duplicate edges found in graph"
     print("test_with_duplicate_edges passed")   
     
+def test_reachability_index():
+    node_a = Node(node_id="A", data={"key": 10})
+    node_b = Node(node_id="B", data={"key": 0})
+    node_c = Node(node_id="C", data={"key": 0})
+    node_d = Node(node_id="D", data={"key": 0})
+    node_e = Node(node_id="E", data={"key": 0})
+    edge_ab = Edge(src_node="A", dst_node="B", src_to_dst_data_keys={"key": "key"})
+    edge_ac = Edge(src_node="A", dst_node="C", src_to_dst_data_keys={"key": "key"})
+    edge_bd = Edge(src_node="B", dst_node="D", src_to_dst_data_keys={"key": "key"})
+    edge_cd = Edge(src_node="C", dst_node="D", src_to_dst_data_keys={"key": "key"})
+    node_a.paths_out.extend([edge_ab, edge_ac])
+    node_b.paths_in.append(edge_ab)
+    node_c.paths_in.append(edge_ac)
+    node_b.paths_out.append(edge_bd)
+    node_c.paths_out.append(edge_cd)
+    node_d.paths_in.extend([edge_bd, edge_cd])
+    graph = Graph(nodes=[node_a, node_b, node_c, node_d, node_e])
+
+    index = graph.get_reachability_index()
+    assert index.descendants("A") == {"B", "C", "D"}
+    assert index.ancestors("D") == {"A", "B", "C"}
+    assert index.ancestors("E") == set()
+    assert index.reaches("A", "D")
+    assert index.reaches("C", "D")
+    assert not index.reaches("D", "A")
+    assert not index.reaches("B", "C")
+    assert not index.reaches("A", "A")
+    assert not index.reaches("E", "D")
+
+    config = GraphRunConfig(root_inputs={"A": {"key": 5}}, enable_list=["D"], include_dependencies=True)
+    run_id = graph.run(config)
+    assert graph.get_data(run_id, "D")["key"] == 5
+    assert graph.get_data(run_id, "E")["key"] == 0
+    print("test_reachability_index passed")
+
+def test_frozen_value_mode():
+    data_a = {"items": [1, 2], "meta": {"tags": ["x"]}}
+    node_a = Node(node_id="A", data=data_a)
+    node_b = Node(node_id="B", data={"items": [], "meta": {}})
+    node_c = Node(node_id="C", data={"items": [], "meta": {}})
+    edge_ab = Edge(src_node="A", dst_node="B", src_to_dst_data_keys={"items": "items", "meta": "meta"})
+    edge_ac = Edge(src_node="A", dst_node="C", src_to_dst_data_keys={"items": "items", "meta": "meta"})
+    node_a.paths_out.extend([edge_ab, edge_ac])
+    node_b.paths_in.append(edge_ab)
+    node_c.paths_in.append(edge_ac)
+    graph = Graph(nodes=[node_a, node_b, node_c])
+
+    config = GraphRunConfig(root_inputs={"A": {"items": [3, 4]}}, value_mode="frozen")
+    run_id = graph.run(config)
+    items_b = graph.get_data(run_id, "B")["items"]
+    assert items_b == [3, 4]
+    assert items_b is graph.get_data(run_id, "C")["items"]
+    try:
+        items_b.append(5)
+        assert False, "frozen list was mutated"
+    except TypeError:
+        pass
+    try:
+        graph.get_data(run_id, "B")["meta"]["tags"] += ["y"]
+        assert False, "frozen dict was mutated"
+    except TypeError:
+        pass
+    graph.get_data(run_id, "B")["meta"] = graph.get_data(run_id, "B")["meta"].set("tags", ["y"])
+    assert graph.get_data(run_id, "C")["meta"]["tags"] == ["x"]
+    assert thaw(graph.get_data(run_id, "B")["meta"]) == {"tags": ["y"]}
+    assert type(data_a["meta"]) is dict and type(data_a["meta"]["tags"]) is list
+
+    # Later runs in other modes get mutable values again
+    run_id = graph.run(GraphRunConfig(value_mode="copy"))
+    graph.get_data(run_id, "B")["items"].append(5)
+    graph.get_data(run_id, "C")["meta"]["tags"].append("z")
+    assert graph.get_data(run_id, "A")["items"] == [3, 4]
+    run_id = graph.run(GraphRunConfig())
+    assert type(graph.get_data(run_id, "B")["meta"]) is dict
+
+    config = GraphRunConfig(root_inputs={"A": {"items": [5]}}, value_mode="copy")
+    run_id = graph.run(config)
+    assert graph.get_data(run_id, "B")["items"] == graph.get_data(run_id, "C")["items"]
+    assert graph.get_data(run_id, "B")["items"] is not graph.get_data(run_id, "C")["items"]
+    print("test_frozen_value_mode passed")
+
+def test_iter_run_yields_levels():
+    node_a = Node(node_id="A", data={"key": 0})
+    node_b = Node(node_id="B", data={"key": 0})
+    node_c = Node(node_id="C", data={"key": 0})
+    edge_ab = Edge(src_node="A", dst_node="B", src_to_dst_data_keys={"key": "key"})
+    edge_bc = Edge(src_node="B", dst_node="C", src_to_dst_data_keys={"key": "key"})
+    node_a.paths_out.append(edge_ab)
+    node_b.paths_in.append(edge_ab)
+    node_b.paths_out.append(edge_bc)
+    node_c.paths_in.append(edge_bc)
+    graph = Graph(nodes=[node_a, node_b, node_c])
+
+    batches = graph.iter_run(GraphRunConfig(root_inputs={"A": {"key": 7}}))
+    assert next(batches) == {"A": {"key": 7}}
+    # C has not been reached yet while B's batch is being consumed
+    assert next(batches) == {"B": {"key": 7}}
+    assert node_c.data["key"] == 0
+    assert next(batches) == {"C": {"key": 7}}
+    assert next(batches, None) is None
+    print("test_iter_run_yields_levels passed")
+
+def test_port_schemas():
+    node_a = Node(node_id="A", outputs={"count": int, "label": "str"})
+    node_b = Node(node_id="B", inputs={"total": "float", "name": str})
+    edge_ab = Edge(src_node="A", dst_node="B", src_to_dst_data_keys={"count": "total", "label": "name"})
+    node_a.paths_out.append(edge_ab)
+    node_b.paths_in.append(edge_ab)
+    graph = Graph(nodes=[node_a, node_b])
+
+    config = GraphRunConfig(root_inputs={"A": {"count": 3, "label": "x"}}, validate_inputs=True)
+    run_id = graph.run(config)
+    assert graph.get_data(run_id, "B") == {"total": 3, "name": "x"}
+    try:
+        graph.run(GraphRunConfig(root_inputs={"A": {"count": "3"}}, validate_inputs=True))
+        assert False, "invalid root input was accepted"
+    except ValueError as e:
+        assert str(e) == "Invalid type for A.count: expected int, got str"
+
+    node_c = Node(node_id="C", outputs={"label": str})
+    node_d = Node(node_id="D", inputs={"count": int})
+    edge_cd = Edge(src_node="C", dst_node="D", src_to_dst_data_keys={"label": "count"})
+    node_c.paths_out.append(edge_cd)
+    node_d.paths_in.append(edge_cd)
+    try:
+        Graph(nodes=[node_c, node_d])
+        assert False, "incompatible ports were accepted"
+    except ValueError as e:
+        assert str(e) == "Incompatible data types for label -> count"
+    print("test_port_schemas passed")
+
+def test_run_cancellation_and_timeouts():
+    node_a = Node(node_id="A", data={"key": 1})
+    node_b = Node(node_id="B", data={"key": 0})
+    node_c = Node(node_id="C", data={"key": 0})
+    edge_ab = Edge(src_node="A", dst_node="B", src_to_dst_data_keys={"key": "key"})
+    edge_bc = Edge(src_node="B", dst_node="C", src_to_dst_data_keys={"key": "key"})
+    node_a.paths_out.append(edge_ab)
+    node_b.paths_in.append(edge_ab)
+    node_b.paths_out.append(edge_bc)
+    node_c.paths_in.append(edge_bc)
+    graph = Graph(nodes=[node_a, node_b, node_c])
+
+    config = GraphRunConfig(root_inputs={"A": {"key": 5}})
+    batches = graph.iter_run(config)
+    next(batches)
+    config.cancel()
+    try:
+        next(batches)
+        assert False, "cancelled run kept going"
+    except RunCancelled:
+        pass
+    assert (node_a.data["key"], node_b.data["key"], node_c.data["key"]) == (1, 0, 0)
+
+    config = GraphRunConfig(root_inputs={"A": {"key": 6}}, timeout=0.01)
+    batches = graph.iter_run(config)
+    next(batches)
+    time.sleep(0.02)
+    try:
+        next(batches)
+        assert False, "run outlived its timeout"
+    except TimeoutError as e:
+        assert str(e) == "Run exceeded its timeout of 0.01s"
+    assert (node_a.data["key"], node_b.data["key"], node_c.data["key"]) == (1, 0, 0)
+
+    try:
+        graph.run(GraphRunConfig(root_inputs={"A": {"key": 8}}, node_timeout=-1))
+        assert False, "node outlived its timeout"
+    except TimeoutError as e:
+        assert str(e) == "Node A exceeded its timeout of -1s"
+    assert node_b.data["key"] == 0
+
+    graph.run(GraphRunConfig(root_inputs={"A": {"key": 7}}, timeout=10, node_timeout=10))
+    assert node_c.data["key"] == 7
+    print("test_run_cancellation_and_timeouts passed")
+
+def test_run_stats():
+    run_stats.reset()
+    node_a = Node(node_id="A", data={"key": 1})
+    node_b = Node(node_id="B", data={"key": 0})
+    edge_ab = Edge(src_node="A", dst_node="B", src_to_dst_data_keys={"key": "key"})
+    node_a.paths_out.append(edge_ab)
+    node_b.paths_in.append(edge_ab)
+    graph = Graph(nodes=[node_a, node_b])
+
+    graph.run(GraphRunConfig(root_inputs={"A": {"key": 2}}))
+    config = GraphRunConfig()
+    config.cancel()
+    try:
+        graph.run(config)
+    except RunCancelled:
+        pass
+    assert run_stats.runs["succeeded"] == 1
+    assert run_stats.runs["cancelled"] == 1
+    assert run_stats.nodes_processed == 2
+    assert run_stats.max_graph_nodes == 2
+    assert 'graph_runs_total{outcome="succeeded"} 1' in run_stats.to_prometheus()
+    print("test_run_stats passed")
+
+def test_cli_runner():
+    import json
+    import os
+    import tempfile
+    import cli
+
+    def write(path, content):
+        with open(path, "w") as f:
+            json.dump(content, f)
+        return path
+
+    def run(*args):
+        status = cli.main([*args, "--output", output])
+        with open(output) as f:
+            return status, [json.loads(line) for line in f]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        graphs = os.path.join(tmp, "graphs")
+        os.mkdir(graphs)
+        output = os.path.join(tmp, "out.ndjson")
+        good = write(os.path.join(graphs, "b_good.json"), {
+            "nodes": [{"node_id": "A", "data": {"x": 1}}, {"node_id": "B", "data": {"y": 0}}],
+            "edges": [{"src_node": "A", "dst_node": "B", "src_to_dst_data_keys": {"x": "y"}}],
+            "run": {"root_inputs": {"A": {"x": 5}}},
+        })
+        write(os.path.join(graphs, "a_bad.json"),
+              {"nodes": [{"node_id": "A", "data": [1]}], "run": {"value_mode": "frozen"}})
+        config = write(os.path.join(tmp, "config.json"), {"root_inputs": {"A": {"x": 7}}})
+
+        status, results = run(good, "--jobs", "1")
+        assert status == 0
+        assert results[0]["status"] == "succeeded"
+        assert results[0]["outputs"]["B"] == {"y": 5}
+
+        status, results = run(good, "--config", config, "--jobs", "1")
+        assert status == 0
+        assert results[0]["outputs"]["B"] == {"y": 7}
+
+        status, results = run(graphs, "--jobs", "2")
+        assert status == 1
+        assert [os.path.basename(result["file"]) for result in results] == ["a_bad.json", "b_good.json"]
+        assert results[0]["status"] == "failed"
+        assert results[0]["error"]
+        assert results[1]["status"] == "succeeded"
+    print("test_cli_runner passed")
+
 def run_tests():
     test_graph_initialization()
     test_run_graph_basic_propagation()
@@ -432,6 +1040,13 @@ def run_tests():
     test_with_cycle()
     test_with_incompatible_types()
     test_with_duplicate_edges()
+    test_reachability_index()
+    test_frozen_value_mode()
+    test_iter_run_yields_levels()
+    test_port_schemas()
+    test_run_cancellation_and_timeouts()
+    test_run_stats()
+    test_cli_runner()
     
 if __name__ == "__main__":
     run_tests()
\ No newline at end of file
@@ -0,0 +1,95 @@
+# myapp/async_views.py
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from .history import record_run, reconstruct_node_data
+from .graph_execution import RunCancelled, RunTimedOut
+from .metrics import RUN_PHASE_SECONDS, RUNS
+from .scheduling import AdmissionRejected, RunTooCostly, admission, estimate_cost, in_flight, run_token
+from .models import RunConfig, RunRecord
+from .plans import abuild_dag, get_compiled_graph
+from .serializers import RunConfigSerializer
+
+# Async counterparts of RunConfigViewSet.create and .node_data. Under ASGI they
+# do not hold a worker thread while waiting on the database; the data flow
+# itself runs in a thread outside the request's sync context.
+
+def _finish_run(serializer, run_config, dag):
+    with RUN_PHASE_SECONDS.time(phase='record'):
+        record_run(run_config, dag)
+    run_config.status = 'succeeded'
+    run_config.save(update_fields=['status'])
+    RUNS.inc(outcome='succeeded')
+    return serializer.data
+
+@csrf_exempt
+@require_POST
+async def create_run(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'detail': 'Malformed JSON body.'}, status=400)
+    serializer = RunConfigSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    run_config = RunConfig(**serializer.validated_data)
+    compiled = await sync_to_async(get_compiled_graph)(run_config.graph)
+    try:
+        # Waiting for a slot blocks, so it happens off the event loop
+        with RUN_PHASE_SECONDS.time(phase='admission'):
+            ticket = await sync_to_async(admission.acquire, thread_sensitive=False)(
+                run_config.graph.pk, estimate_cost(compiled, run_config))
+    except RunTooCostly as e:
+        RUNS.inc(outcome='rejected')
+        return JsonResponse({'detail': str(e)}, status=422)
+    except AdmissionRejected as e:
+        RUNS.inc(outcome='rejected')
+        response = JsonResponse({'detail': str(e)}, status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    try:
+        run_config = await sync_to_async(serializer.save)(status='running')
+        token = run_token(run_config)
+        in_flight.register(run_config.pk, token)
+        try:
+            with RUN_PHASE_SECONDS.time(phase='build'):
+                dag = await abuild_dag(run_config.graph, run_config)
+            remaining = token.deadline - time.monotonic() if token.deadline is not None else None
+            # The deadline is also enforced from here: the caller stops waiting
+            # and the worker thread stops at its next check of the token
+            await asyncio.wait_for(
+                sync_to_async(dag.process_data_flow, thread_sensitive=False)(token), remaining)
+        except (RunCancelled, asyncio.TimeoutError) as e:
+            token.cancel()
+            timed_out = not isinstance(e, RunCancelled) or isinstance(e, RunTimedOut)
+            run_status = 'timed_out' if timed_out else 'cancelled'
+            await RunConfig.objects.filter(pk=run_config.pk).aupdate(status=run_status)
+            RUNS.inc(outcome=run_status)
+            return JsonResponse(
+                {'detail': f'Run {run_config.pk}: {"Run timed out." if timed_out else "Run was cancelled."}'},
+                status=504 if timed_out else 409)
+        except Exception:
+            await RunConfig.objects.filter(pk=run_config.pk).aupdate(status='failed')
+            RUNS.inc(outcome='failed')
+            raise
+        finally:
+            in_flight.unregister(run_config.pk, token)
+    finally:
+        admission.release(ticket)
+    return JsonResponse(await sync_to_async(_finish_run)(serializer, run_config, dag), status=201)
+
+@require_GET
+async def run_node_data(request, pk, node_id):
+    record = await RunRecord.objects.filter(run_id=pk).afirst()
+    if record is None:
+        return JsonResponse({'detail': 'No history was recorded for this run.'}, status=404)
+    try:
+        data = await sync_to_async(reconstruct_node_data)(record, node_id)
+    except KeyError:
+        return JsonResponse({'detail': f'Node {node_id} was not part of this run.'}, status=404)
+    return JsonResponse({'run': pk, 'node_id': node_id, **data})
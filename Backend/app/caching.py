@@ -0,0 +1,47 @@
+# myapp/caching.py
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from .metrics import cache_lookup
+
+# Cached entries hold the validator (graph version or node list ETag) next to
+# the serialized data, so a stale entry is never served even if the signal
+# that deletes it ran in another process.
+# Responses are validated by ETag only: Last-Modified has one-second
+# granularity and does not move forward when a node is deleted, so an
+# If-Modified-Since check could answer 304 for a changed resource.
+
+def graph_response_key(graph_id):
+    return f'graph-response:{graph_id}'
+
+NODE_LIST_KEY = 'node-list-response'
+
+def get_cached(key, validator):
+    entry = cache.get(key)
+    hit = entry is not None and entry[0] == validator
+    cache_lookup('response', hit)
+    return entry[1] if hit else None
+
+def set_cached(key, validator, data):
+    cache.set(key, (validator, data), getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+def invalidate_graphs(graph_ids):
+    cache.delete_many([graph_response_key(graph_id) for graph_id in graph_ids])
+
+def invalidate_node_list():
+    cache.delete(NODE_LIST_KEY)
+
+def conditional_response(request, etag):
+    """Return a 304 (or 412) response if the request's preconditions allow it."""
+    return get_conditional_response(request, etag=etag)
+
+def set_validators(response, etag):
+    response['ETag'] = etag
+    return response
+
+def graph_etag(graph_id, version):
+    return quote_etag(f'graph-{graph_id}-v{version}')
+
+def node_list_etag(count, updated_at):
+    return quote_etag(f'nodes-{count}-{updated_at.timestamp() if updated_at else 0}')
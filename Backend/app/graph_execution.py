@@ -1,7 +1,10 @@
 # myapp/graph_execution.py
+import threading
+import time
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
-from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from collections import defaultdict, deque
+from .metrics import GRAPH_EDGES, GRAPH_NODES, NODES_PROCESSED, RUN_PHASE_SECONDS
 
 @dataclass
 class Edge:
@@ -16,14 +19,184 @@ class Node:
     data_out: Dict[str, any] = field(default_factory=dict)
     incoming_edges: List[Edge] = field(default_factory=list)
     outgoing_edges: List[Edge] = field(default_factory=list)
+    input_ports: Dict[str, str] = field(default_factory=dict)
+    output_ports: Dict[str, str] = field(default_factory=dict)
+
+# Port type names accepted in Node.input_ports / Node.output_ports
+PORT_TYPES = {'bool': bool, 'int': int, 'float': float, 'str': str, 'list': list, 'dict': dict}
+
+def value_type_name(value) -> Optional[str]:
+    # bool is checked before int as it is a subclass of it
+    for name, port_type in PORT_TYPES.items():
+        if isinstance(value, port_type):
+            return name
+    return None
+
+def port_accepts(expected: str, actual: Optional[str]) -> bool:
+    # JSON does not tell ints and floats apart, so ints fill float ports
+    return expected == actual or (expected == 'float' and actual == 'int')
+
+class PortSchema:
+    """Port types of a DAG, compiled once. Edges are checked on construction;
+    validate_outputs() is the cheap per-run check for root inputs/overwrites."""
+    def __init__(self, nodes: Dict[str, Node]):
+        self._output_ports: Dict[str, Dict[str, str]] = {}
+        for node in nodes.values():
+            for port_type in list(node.input_ports.values()) + list(node.output_ports.values()):
+                if port_type not in PORT_TYPES:
+                    raise ValueError(f"Unknown port type {port_type} on node {node.node_id}")
+            if node.output_ports:
+                self._output_ports[node.node_id] = dict(node.output_ports)
+            for edge in node.outgoing_edges:
+                for src_key, dst_key in (edge.src_to_dst_data_keys or {}).items():
+                    src_type = node.output_ports.get(src_key)
+                    dst_type = edge.dst_node.input_ports.get(dst_key)
+                    if src_type and dst_type and not port_accepts(dst_type, src_type):
+                        raise ValueError(f"Incompatible data types for {src_key} -> {dst_key}")
+
+    def validate_outputs(self, node_id: str, data: Dict[str, any]) -> None:
+        ports = self._output_ports.get(node_id)
+        if not ports:
+            return
+        for key, value in data.items():
+            expected = ports.get(key)
+            if expected and not port_accepts(expected, value_type_name(value)):
+                raise ValueError(f"Invalid type for {node_id}.{key}: expected {expected}, "
+                                 f"got {value_type_name(value) or type(value).__name__}")
+
+@dataclass
+class CompiledGraph:
+    ports: PortSchema
+    node_count: int = 0
+    edge_count: int = 0
+    # Number of data keys copied along all edges
+    key_fanout: int = 0
+    reachability: Optional['ReachabilityIndex'] = None
+
+class RunCancelled(Exception):
+    pass
+
+class RunTimedOut(RunCancelled):
+    pass
+
+class CancelToken:
+    """Cooperative stop signal for a run, checked between levels and nodes.
+    Carries the run's deadline (a time.monotonic() value) and per-node timeout."""
+    def __init__(self, deadline: Optional[float] = None, node_timeout: Optional[float] = None):
+        self.deadline = deadline
+        self.node_timeout = node_timeout
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise RunCancelled("Run was cancelled")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise RunTimedOut("Run exceeded its deadline")
+
+class ReachabilityIndex:
+    """Ancestor/descendant queries over an acyclic DAG.
+
+    Each node carries its topological position and a pre/post interval from a
+    DFS spanning forest; queries those labels cannot settle are answered from
+    per-node descendant bitsets.
+    """
+    def __init__(self, order: List[Node]):
+        self._order = [node.node_id for node in order]
+        self._position = {node_id: i for i, node_id in enumerate(self._order)}
+        size = len(order)
+        self._descendants = [0] * size
+        self._ancestors = [0] * size
+        for i in range(size - 1, -1, -1):
+            for edge in order[i].outgoing_edges:
+                j = self._position[edge.dst_node.node_id]
+                self._descendants[i] |= self._descendants[j] | (1 << j)
+        for i in range(size):
+            for edge in order[i].outgoing_edges:
+                j = self._position[edge.dst_node.node_id]
+                self._ancestors[j] |= self._ancestors[i] | (1 << i)
+
+        self._pre = [0] * size
+        self._post = [0] * size
+        visited = [False] * size
+        counter = 0
+        for root in range(size):
+            if visited[root]:
+                continue
+            visited[root] = True
+            self._pre[root] = counter
+            counter += 1
+            stack = [(root, iter(order[root].outgoing_edges))]
+            while stack:
+                i, edges = stack[-1]
+                for edge in edges:
+                    j = self._position[edge.dst_node.node_id]
+                    if not visited[j]:
+                        visited[j] = True
+                        self._pre[j] = counter
+                        counter += 1
+                        stack.append((j, iter(edge.dst_node.outgoing_edges)))
+                        break
+                else:
+                    stack.pop()
+                    self._post[i] = counter
+                    counter += 1
+
+    def _index(self, node_id: str) -> int:
+        try:
+            return self._position[node_id]
+        except KeyError:
+            raise ValueError(f"Node {node_id} not found in the graph")
+
+    def _decode(self, bits: int) -> Set[str]:
+        result = set()
+        while bits:
+            low = bits & -bits
+            result.add(self._order[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def reaches(self, src_id: str, dst_id: str) -> bool:
+        i, j = self._index(src_id), self._index(dst_id)
+        if i >= j:
+            return False
+        if self._pre[i] < self._pre[j] and self._post[j] < self._post[i]:
+            return True
+        return bool(self._descendants[i] >> j & 1)
+
+    def descendants(self, node_id: str) -> Set[str]:
+        return self._decode(self._descendants[self._index(node_id)])
+
+    def ancestors(self, node_id: str) -> Set[str]:
+        return self._decode(self._ancestors[self._index(node_id)])
+
+    def with_ancestors(self, node_ids) -> Set[str]:
+        """node_ids together with all their ancestors; unknown ids are skipped."""
+        bits = 0
+        for node_id in node_ids:
+            i = self._position.get(node_id)
+            if i is not None:
+                bits |= self._ancestors[i] | (1 << i)
+        return self._decode(bits)
+
+    def __contains__(self, node_id) -> bool:
+        return node_id in self._position
 
 class DAG:
     def __init__(self):
         self.nodes: Dict[str, Node] = {}
+        self._reachability: Optional[ReachabilityIndex] = None
 
     def add_node(self, node_id: str) -> Node:
         if node_id not in self.nodes:
             self.nodes[node_id] = Node(node_id=node_id)
+            self._reachability = None
         return self.nodes[node_id]
 
     def add_edge(self, src_id: str, dst_id: str, src_to_dst_data_keys: Optional[Dict[str, str]] = None) -> Edge:
@@ -33,8 +206,39 @@ class DAG:
         edge = Edge(src_node=src_node, dst_node=dst_node, src_to_dst_data_keys=src_to_dst_data_keys)
         src_node.outgoing_edges.append(edge)
         dst_node.incoming_edges.append(edge)
+        self._reachability = None
         return edge
 
+    def compile(self) -> CompiledGraph:
+        edges = [edge for node in self.nodes.values() for edge in node.outgoing_edges]
+        return CompiledGraph(
+            ports=PortSchema(self.nodes),
+            node_count=len(self.nodes),
+            edge_count=len(edges),
+            key_fanout=sum(len(edge.src_to_dst_data_keys or {}) for edge in edges),
+            reachability=self.reachability(),
+        )
+
+    def _topological_order(self) -> List[Node]:
+        in_degree = {node_id: len(node.incoming_edges) for node_id, node in self.nodes.items()}
+        queue = deque(node for node_id, node in self.nodes.items() if in_degree[node_id] == 0)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for edge in node.outgoing_edges:
+                in_degree[edge.dst_node.node_id] -= 1
+                if in_degree[edge.dst_node.node_id] == 0:
+                    queue.append(edge.dst_node)
+        if len(order) != len(self.nodes):
+            raise ValueError("Cycle detected in the graph")
+        return order
+
+    def reachability(self) -> ReachabilityIndex:
+        if self._reachability is None:
+            self._reachability = ReachabilityIndex(self._topological_order())
+        return self._reachability
+
     def _get_node_levels(self) -> Dict[str, int]:
         levels = {}
         visited = set()
@@ -54,15 +258,29 @@ class DAG:
 
         return levels
 
-    def process_data_flow(self) -> None:
+    def process_data_flow(self, token: Optional[CancelToken] = None) -> None:
+        GRAPH_NODES.observe(len(self.nodes))
+        GRAPH_EDGES.observe(sum(len(node.outgoing_edges) for node in self.nodes.values()))
+        with RUN_PHASE_SECONDS.time(phase='execute'):
+            for _ in self.iter_data_flow(token):
+                pass
+
+    def iter_data_flow(self, token: Optional[CancelToken] = None) -> Iterator[Tuple[int, Dict[str, Node]]]:
+        """Process the data flow level by level, yielding (level, nodes) once
+        every node of that level has its data_in filled in. With a token, the
+        run stops with RunCancelled/RunTimedOut at the next node boundary."""
+        token = token or CancelToken()
         levels = self._get_node_levels()
         level_to_nodes = defaultdict(list)
         for node_id, level in levels.items():
             level_to_nodes[level].append(node_id)
 
         for level in sorted(level_to_nodes.keys()):
+            token.check()
             level_nodes = sorted(level_to_nodes[level])
             for node_id in level_nodes:
+                token.check()
+                started = time.monotonic()
                 node = self.nodes[node_id]
                 dst_key_sources: Dict[str, Tuple[int, str, any]] = {}
                 for edge in node.incoming_edges:
@@ -83,3 +301,7 @@ class DAG:
                                 dst_key_sources[dst_key] = (src_level, src_node.node_id, value)
                 for dst_key, (_, _, value) in dst_key_sources.items():
                     node.data_in[dst_key] = value
+                if token.node_timeout is not None and time.monotonic() - started > token.node_timeout:
+                    raise RunTimedOut(f"Node {node_id} exceeded its timeout of {token.node_timeout}s")
+            NODES_PROCESSED.inc(len(level_nodes))
+            yield level, {node_id: self.nodes[node_id] for node_id in level_nodes}
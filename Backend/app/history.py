@@ -0,0 +1,165 @@
+# myapp/history.py
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from .metrics import cache_lookup
+from .models import RunRecord
+
+# Payload layout
+#   checkpoint: {node_id: {"data_in": {...}, "data_out": {...}}}
+#   delta:      {node_id: None}  for a node missing from the run, or
+#               {node_id: {"data_in": {"set": {...}, "unset": [...]}, "data_out": {...}}}
+#               listing only the changed keys of the changed nodes.
+DATA_FIELDS = ('data_in', 'data_out')
+
+def snapshot_dag(dag):
+    return {
+        node_id: {'data_in': node.data_in, 'data_out': node.data_out}
+        for node_id, node in dag.nodes.items()
+    }
+
+def diff_data(base, new):
+    changes = {}
+    updated = {key: value for key, value in new.items() if key not in base or base[key] != value}
+    removed = [key for key in base if key not in new]
+    if updated:
+        changes['set'] = updated
+    if removed:
+        changes['unset'] = removed
+    return changes
+
+def diff_snapshots(base, new):
+    delta = {}
+    for node_id, node_data in new.items():
+        base_data = base.get(node_id)
+        if base_data is None:
+            base_data = {field: {} for field in DATA_FIELDS}
+        node_delta = {}
+        for field in DATA_FIELDS:
+            changes = diff_data(base_data[field], node_data[field])
+            if changes:
+                node_delta[field] = changes
+        if node_delta or node_id not in base:
+            delta[node_id] = node_delta
+    for node_id in base:
+        if node_id not in new:
+            delta[node_id] = None
+    return delta
+
+def apply_node_delta(base_data, node_delta):
+    """Rebuild one node's data from its checkpoint data and its delta entry."""
+    if base_data is None:
+        base_data = {field: {} for field in DATA_FIELDS}
+    node_data = {}
+    for field in DATA_FIELDS:
+        data = dict(base_data[field])
+        changes = node_delta.get(field, {})
+        data.update(changes.get('set', {}))
+        for key in changes.get('unset', []):
+            data.pop(key, None)
+        node_data[field] = data
+    return node_data
+
+class CheckpointCache:
+    """Checkpoints never change once written, so their decoded payloads can be
+    kept around between reconstructions."""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._payloads: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, checkpoint_id):
+        with self._lock:
+            payload = self._payloads.get(checkpoint_id)
+            if payload is not None:
+                self._payloads.move_to_end(checkpoint_id)
+                cache_lookup('checkpoint', hit=True)
+                return payload
+        cache_lookup('checkpoint', hit=False)
+        payload = RunRecord.objects.values_list('payload', flat=True).get(pk=checkpoint_id)
+        with self._lock:
+            self._payloads[checkpoint_id] = payload
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def discard(self, checkpoint_id):
+        with self._lock:
+            self._payloads.pop(checkpoint_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+checkpoint_cache = CheckpointCache(getattr(settings, 'RUN_HISTORY_CHECKPOINT_CACHE_SIZE', 32))
+
+def record_run(run_config, dag):
+    """Store the node data of a finished run as a delta against the latest
+    checkpoint of the same graph version. A new checkpoint is written for the
+    first run of a version, every RUN_HISTORY_CHECKPOINT_INTERVAL runs, or
+    when the delta would be more than half the size of a full copy."""
+    graph = run_config.graph
+    snapshot = snapshot_dag(dag)
+    checkpoint = (
+        RunRecord.objects
+        .filter(graph=graph, graph_version=graph.version, checkpoint__isnull=True)
+        .order_by('-pk')
+        .only('pk')
+        .first()
+    )
+    interval = getattr(settings, 'RUN_HISTORY_CHECKPOINT_INTERVAL', 50)
+    if checkpoint is not None and checkpoint.deltas.count() < interval - 1:
+        delta = diff_snapshots(checkpoint_cache.get(checkpoint.pk), snapshot)
+        if len(json.dumps(delta)) * 2 <= len(json.dumps(snapshot)):
+            return RunRecord.objects.create(
+                run=run_config, graph=graph, graph_version=graph.version,
+                checkpoint=checkpoint, payload=delta,
+            )
+    return RunRecord.objects.create(
+        run=run_config, graph=graph, graph_version=graph.version, payload=snapshot,
+    )
+
+def reconstruct_node_data(record, node_id):
+    """Return {"data_in": ..., "data_out": ...} of node_id for a recorded run."""
+    if record.is_checkpoint:
+        node_data = record.payload.get(node_id)
+    elif node_id not in record.payload:
+        node_data = checkpoint_cache.get(record.checkpoint_id).get(node_id)
+    elif record.payload[node_id] is None:
+        node_data = None
+    else:
+        base = checkpoint_cache.get(record.checkpoint_id).get(node_id)
+        node_data = apply_node_delta(base, record.payload[node_id])
+    if node_data is None:
+        raise KeyError(node_id)
+    return node_data
+
+def expand_record(record, base):
+    """Full snapshot of a delta record, given the payload of its checkpoint."""
+    snapshot = {node_id: node_data for node_id, node_data in base.items() if node_id not in record.payload}
+    for node_id, node_delta in record.payload.items():
+        if node_delta is not None:
+            snapshot[node_id] = apply_node_delta(base.get(node_id), node_delta)
+    return snapshot
+
+def promote_checkpoint_successor(record):
+    """Make a checkpoint's records independent of it before it is deleted:
+    its oldest delta becomes the new checkpoint with full node data and the
+    remaining deltas are re-encoded against that one."""
+    if not record.is_checkpoint:
+        return
+    deltas = list(record.deltas.order_by('pk'))
+    if not deltas:
+        return
+    successor, others = deltas[0], deltas[1:]
+    successor.payload = expand_record(successor, record.payload)
+    successor.checkpoint = None
+    for delta in others:
+        delta.payload = diff_snapshots(successor.payload, expand_record(delta, record.payload))
+        delta.checkpoint = successor
+    with transaction.atomic():
+        successor.save(update_fields=['payload', 'checkpoint'])
+        RunRecord.objects.bulk_update(others, ['payload', 'checkpoint'])
+    checkpoint_cache.discard(record.pk)
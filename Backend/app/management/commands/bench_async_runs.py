@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Compare concurrent run throughput of the sync /api/runs/ endpoint and the "
+            "async /api/async/runs/ endpoint using the loadtest harness.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['runserver', 'uvicorn'], default='uvicorn',
+                            help='Server both endpoints are measured on')
+        parser.add_argument('--url', help='Base URL of an already running server')
+        parser.add_argument('--graphs', type=int, default=5)
+        parser.add_argument('--nodes', type=int, default=100)
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=15.0)
+        parser.add_argument('--max-concurrent-runs', type=int,
+                            help='Admission limit of the started server, globally and per graph '
+                                 '(default: --clients, so runs never wait in the admission queue)')
+
+    def handle(self, *args, **options):
+        # Admission limits only apply to the server started here; with the
+        # defaults most runs would wait in the same queue on both endpoints
+        limit = options['max_concurrent_runs'] or options['clients']
+        admission = None if options['url'] else {
+            'RUN_MAX_CONCURRENT_RUNS': limit,
+            'RUN_MAX_CONCURRENT_RUNS_PER_GRAPH': limit,
+            'RUN_MAX_QUEUED_RUNS': max(limit, options['clients']),
+        }
+        results = {}
+        for name, mix in (('sync', 'run_create=1'), ('async', 'async_run_create=1')):
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                path = f.name
+            try:
+                with server_env(admission or {}):
+                    call_command(
+                        'loadtest', mix=mix, output=path, server=options['server'], url=options['url'],
+                        graphs=options['graphs'], nodes=options['nodes'],
+                        clients=options['clients'], duration=options['duration'],
+                    )
+                with open(path) as f:
+                    report = json.load(f)
+            finally:
+                os.unlink(path)
+            endpoint = next(iter(report['endpoints'].values()))
+            results[name] = {
+                'throughput_rps': endpoint['throughput_rps'],
+                'errors': endpoint['errors'],
+                'latency_ms': endpoint['latency_ms'],
+                'db_queries': endpoint['db_queries'],
+            }
+        if results['sync']['throughput_rps']:
+            results['async_speedup'] = round(
+                results['async']['throughput_rps'] / results['sync']['throughput_rps'], 2)
+        results['config'] = {key: options[key] for key in ('server', 'graphs', 'nodes', 'clients', 'duration')}
+        results['config']['url'] = options['url']
+        results['config']['admission'] = admission
+        self.stdout.write(json.dumps(results, indent=2))
+
+
+@contextmanager
+def server_env(variables):
+    """Set environment variables for the servers started inside the block."""
+    previous = {key: os.environ.get(key) for key in variables}
+    os.environ.update({key: str(value) for key, value in variables.items()})
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
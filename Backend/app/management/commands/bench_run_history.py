@@ -0,0 +1,107 @@
+import json
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.graph_execution import DAG
+from app.history import checkpoint_cache, record_run, reconstruct_node_data, snapshot_dag
+from app.models import Graph, RunConfig, RunRecord
+
+
+class Command(BaseCommand):
+    help = ("Compare delta-encoded run history against full copies: bytes written "
+            "per run and node reconstruction latency. Everything is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=200)
+        parser.add_argument('--runs', type=int, default=100)
+        parser.add_argument('--changed', type=int, default=5,
+                            help='Root inputs changed per run')
+        parser.add_argument('--reads', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            results = self.run_benchmark(rng, **options)
+            transaction.set_rollback(True)
+        checkpoint_cache.clear()
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def build_dag(self, size, root_inputs):
+        # Chains of four nodes; the first node of each chain is a root input
+        dag = DAG()
+        for i in range(size):
+            node = dag.add_node(f"bench-{i}")
+            node.data_out.update({"value": i, "label": f"node {i}"})
+            if i % 4:
+                dag.add_edge(f"bench-{i - 1}", node.node_id, {"value": "value"})
+        for node_id, data in root_inputs.items():
+            dag.nodes[node_id].data_out.update(data)
+        dag.process_data_flow()
+        return dag
+
+    def run_benchmark(self, rng, nodes, runs, changed, reads, **options):
+        graph = Graph.objects.create()
+        roots = [f"bench-{i}" for i in range(0, nodes, 4)]
+
+        delta_bytes, full_bytes, delta_write, full_write = [], [], [], []
+        records = []
+        for _ in range(runs):
+            root_inputs = {node_id: {"value": rng.random()} for node_id in rng.sample(roots, min(changed, len(roots)))}
+            dag = self.build_dag(nodes, root_inputs)
+            run_config = RunConfig.objects.create(graph=graph, root_inputs=root_inputs)
+
+            start = time.perf_counter()
+            record = record_run(run_config, dag)
+            delta_write.append(time.perf_counter() - start)
+            delta_bytes.append(len(json.dumps(record.payload)))
+
+            # Full copies are written under a version no delta record uses
+            full_payload = snapshot_dag(dag)
+            full_run = RunConfig.objects.create(graph=graph, root_inputs=root_inputs)
+            start = time.perf_counter()
+            full = RunRecord(run=full_run, graph=graph, graph_version=0, payload=full_payload)
+            RunRecord.objects.bulk_create([full])
+            full_write.append(time.perf_counter() - start)
+            full_bytes.append(len(json.dumps(full_payload)))
+            records.append((record.pk, full.pk))
+
+        delta_read, full_read = [], []
+        for _ in range(reads):
+            delta_pk, full_pk = rng.choice(records)
+            node_id = f"bench-{rng.randrange(nodes)}"
+
+            start = time.perf_counter()
+            reconstruct_node_data(RunRecord.objects.get(pk=delta_pk), node_id)
+            delta_read.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            RunRecord.objects.get(pk=full_pk).payload[node_id]
+            full_read.append(time.perf_counter() - start)
+
+        def latency(samples):
+            samples = sorted(samples)
+            return {
+                'p50_ms': round(statistics.median(samples) * 1000, 3),
+                'p99_ms': round(samples[int(len(samples) * 0.99) - 1] * 1000, 3),
+            }
+
+        return {
+            'nodes': nodes,
+            'runs': runs,
+            'changed_per_run': changed,
+            'delta': {
+                'bytes_written': sum(delta_bytes),
+                'bytes_per_run': round(sum(delta_bytes) / runs),
+                'write': latency(delta_write),
+                'read': latency(delta_read),
+            },
+            'full_copy': {
+                'bytes_written': sum(full_bytes),
+                'bytes_per_run': round(sum(full_bytes) / runs),
+                'write': latency(full_write),
+                'read': latency(full_read),
+            },
+        }
@@ -0,0 +1,277 @@
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app.models import Edge, Graph, Node
+
+# Upper bounds (ms) of the latency histogram buckets
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+DEFAULT_MIX = 'graph_detail=4,node_list=2,edge_list=2,run_list=1,run_create=1'
+
+
+class Command(BaseCommand):
+    help = ("Seed graphs of a configurable size, drive concurrent clients with a mixed "
+            "read/run workload against a local server and report per-endpoint latency "
+            "histograms, throughput and DB query counts as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of an already running server. '
+                                          'By default a server is started on a free port.')
+        parser.add_argument('--server', choices=['runserver', 'uvicorn'], default='runserver',
+                            help='Server to start when --url is not given')
+        parser.add_argument('--graphs', type=int, default=5)
+        parser.add_argument('--nodes', type=int, default=50, help='Nodes per graph')
+        parser.add_argument('--fanout', type=int, default=2, help='Outgoing edges per node')
+        parser.add_argument('--connection', choices=['keep-alive', 'per-request'],
+                            help='Reuse one connection per client or open one per request. Defaults '
+                                 'to per-request for runserver, which does not set TCP_NODELAY, so '
+                                 'reused connections stall on Nagle/delayed ACK; keep-alive otherwise')
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help='Weighted endpoints, e.g. "%s"' % DEFAULT_MIX)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded graphs')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        rng = random.Random(options['seed'])
+        prefix = f"load-{uuid.uuid4().hex[:8]}"
+        graphs = self.seed(prefix, rng, options['graphs'], options['nodes'], options['fanout'])
+        if not options['connection']:
+            runserver = not options['url'] and options['server'] == 'runserver'
+            options['connection'] = 'per-request' if runserver else 'keep-alive'
+        server = None
+        try:
+            base_url = options['url']
+            if not base_url:
+                server, base_url = self.start_server(options['server'])
+            report = self.drive(base_url, graphs, mix, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+            if not options['keep']:
+                Graph.objects.filter(pk__in=[graph['id'] for graph in graphs]).delete()
+                Node.objects.filter(node_id__startswith=f"{prefix}-").delete()
+
+        report['config'] = {
+            key: options[key]
+            for key in ('graphs', 'nodes', 'fanout', 'clients', 'connection', 'duration', 'mix', 'seed')
+        }
+        report['config']['server'] = options['url'] or options['server']
+        report['commit'] = self.current_commit()
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def parse_mix(self, mix):
+        endpoints = {}
+        for item in mix.split(','):
+            name, _, weight = item.partition('=')
+            if name not in ENDPOINTS:
+                raise CommandError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+            endpoints[name] = float(weight or 1)
+        return endpoints
+
+    def seed(self, prefix, rng, graph_count, node_count, fanout):
+        graphs = []
+        for g in range(graph_count):
+            nodes = Node.objects.bulk_create([
+                Node(node_id=f"{prefix}-{g}-{i}", data_out={"value": i})
+                for i in range(node_count)
+            ])
+            edges = []
+            for i in range(node_count - 1):
+                targets = rng.sample(range(i + 1, node_count), min(fanout, node_count - i - 1))
+                edges += [
+                    Edge(src_node=nodes[i], dst_node=nodes[j], src_to_dst_data_keys={"value": f"in{i}"})
+                    for j in targets
+                ]
+            edges = Edge.objects.bulk_create(edges)
+            graph = Graph.objects.create()
+            graph.nodes.set(nodes)
+            graph.edges.set(edges)
+            graphs.append({'id': graph.pk, 'root': nodes[0].node_id})
+        return graphs
+
+    def start_server(self, kind):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        env = dict(os.environ, QUERY_COUNT_HEADER='1')
+        if kind == 'uvicorn':
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError("uvicorn is not installed")
+            command = [sys.executable, '-m', 'uvicorn', 'backend.asgi:application',
+                       '--port', str(port), '--log-level', 'warning']
+        else:
+            env.setdefault('DB_CONN_MAX_AGE', '60')
+            command = [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"{kind} exited with status {server.returncode}")
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                    return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.1)
+        server.terminate()
+        raise CommandError(f"{kind} did not start listening on port {port}")
+
+    def drive(self, base_url, graphs, mix, options):
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        stop_at = time.monotonic() + options['duration']
+        names, weights = list(mix), list(mix.values())
+
+        def client(seed):
+            rng = random.Random(seed)
+            connection = Connection(base_url, keep_alive=options['connection'] == 'keep-alive')
+            local = defaultdict(list)
+            while time.monotonic() < stop_at:
+                name = rng.choices(names, weights)[0]
+                method, path, body = ENDPOINTS[name](rng.choice(graphs), rng)
+                local[name].append(connection.request(method, path, body))
+            connection.close()
+            with lock:
+                for name, results in local.items():
+                    samples[name].extend(results)
+
+        threads = [
+            threading.Thread(target=client, args=(options['seed'] + i,), daemon=True)
+            for i in range(options['clients'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        endpoints = {name: summarize(results, elapsed) for name, results in sorted(samples.items())}
+        total = sum(len(results) for results in samples.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2),
+            'endpoints': endpoints,
+        }
+
+    def current_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+
+ENDPOINTS = {
+    'graph_detail': lambda graph, rng: ('GET', f"/api/graphs/{graph['id']}/", None),
+    'node_list': lambda graph, rng: ('GET', '/api/nodes/', None),
+    'edge_list': lambda graph, rng: ('GET', '/api/edges/', None),
+    'run_list': lambda graph, rng: ('GET', '/api/runs/', None),
+    'run_create': lambda graph, rng: ('POST', '/api/runs/', {
+        'graph': graph['id'],
+        'root_inputs': {graph['root']: {'value': rng.random()}},
+    }),
+    'async_run_create': lambda graph, rng: ('POST', '/api/async/runs/', {
+        'graph': graph['id'],
+        'root_inputs': {graph['root']: {'value': rng.random()}},
+    }),
+}
+
+
+class Connection:
+    """HTTP connection that reconnects after errors. Without keep_alive it is
+    closed after every request."""
+    def __init__(self, base_url, keep_alive=True):
+        parts = urlsplit(base_url)
+        self.keep_alive = keep_alive
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._connection = None
+
+    def request(self, method, path, body=None):
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self._connection.request(method, self.prefix + path, payload, headers)
+            response = self._connection.getresponse()
+            response.read()
+            status = response.status
+            queries = response.getheader('X-DB-Query-Count')
+            if not self.keep_alive or response.getheader('Connection', '').lower() == 'close':
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, queries = None, None
+        return {
+            'latency': time.perf_counter() - start,
+            'status': status,
+            'queries': int(queries) if queries is not None else None,
+        }
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def summarize(results, elapsed):
+    latencies = sorted(result['latency'] * 1000 for result in results)
+    queries = [result['queries'] for result in results if result['queries'] is not None]
+    # Cumulative counts, as in a Prometheus histogram
+    histogram = {
+        f'le_{bound}ms': sum(1 for latency in latencies if latency <= bound)
+        for bound in HISTOGRAM_BUCKETS_MS
+    }
+    histogram['le_inf'] = len(latencies)
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+    return {
+        'requests': len(results),
+        'errors': sum(1 for result in results if result['status'] is None or result['status'] >= 400),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': percentile(0.50),
+            'p90': percentile(0.90),
+            'p99': percentile(0.99),
+            'max': round(latencies[-1], 3),
+        },
+        'histogram': histogram,
+        'db_queries': {
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        } if queries else None,
+    }
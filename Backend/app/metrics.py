@@ -0,0 +1,176 @@
+# myapp/metrics.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple
+
+# In-process metrics, exposed at /metrics in the Prometheus text format.
+# Every worker process keeps its own counters, so scrape each one directly.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[label]) for label in self.labels), 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+class Gauge:
+    """Gauge read from a callback at scrape time. The callback returns a
+    number, or a dict of label-value tuples to numbers for labelled gauges."""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labels = labels
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        value = self.read()
+        if not self.labels:
+            yield self.name, {}, value
+            return
+        for key, sample in sorted(value.items()):
+            yield self.name, dict(zip(self.labels, key)), sample
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.labels = labels
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(tuple(str(labels[label]) for label in self.labels))
+        return counts[-1] if counts else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket', {**labels, 'le': _format_value(bound)}, count
+            yield f'{self.name}_sum', labels, counts[-2]
+            yield f'{self.name}_count', labels, counts[-1]
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def clear(self) -> None:
+        """Reset every counter and histogram (gauges are read live)."""
+        for metric in self._metrics:
+            if hasattr(metric, 'clear'):
+                metric.clear()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+RUNS = registry.register(Counter(
+    'kiwiq_runs_total', 'Runs by outcome.', labels=('outcome',)))
+RUN_PHASE_SECONDS = registry.register(Histogram(
+    'kiwiq_run_phase_seconds', 'Time spent per run phase: admission wait, building the DAG, '
+    'executing the data flow and recording history.', labels=('phase',)))
+NODES_PROCESSED = registry.register(Counter(
+    'kiwiq_nodes_processed_total', 'Nodes whose inputs were filled in by a run.'))
+GRAPH_NODES = registry.register(Histogram(
+    'kiwiq_graph_nodes', 'Nodes per executed graph.', buckets=SIZE_BUCKETS))
+GRAPH_EDGES = registry.register(Histogram(
+    'kiwiq_graph_edges', 'Edges per executed graph.', buckets=SIZE_BUCKETS))
+CACHE_REQUESTS = registry.register(Counter(
+    'kiwiq_cache_requests_total', 'Cache lookups by cache and result (hit or miss).',
+    labels=('cache', 'result')))
+
+def _hit_ratios():
+    ratios = {}
+    for cache_name in {labels['cache'] for _, labels, _ in CACHE_REQUESTS.samples()}:
+        hits = CACHE_REQUESTS.value(cache=cache_name, result='hit')
+        total = hits + CACHE_REQUESTS.value(cache=cache_name, result='miss')
+        ratios[(cache_name,)] = hits / total if total else 0.0
+    return ratios
+
+registry.register(Gauge(
+    'kiwiq_cache_hit_ratio', 'Hits over lookups since the process started, per cache.',
+    _hit_ratios, labels=('cache',)))
+
+def cache_lookup(cache_name: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache_name, result='hit' if hit else 'miss')
@@ -0,0 +1,25 @@
+# myapp/middleware.py
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+class QueryCountMiddleware:
+    """Reports the number of database queries a request ran in the
+    X-DB-Query-Count response header. Only enabled with QUERY_COUNT_HEADER."""
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_COUNT_HEADER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response['X-DB-Query-Count'] = str(count)
+        return response
@@ -6,6 +6,9 @@ class Node(models.Model):
     node_id = models.CharField(max_length=50, unique=True)
     data_in = models.JSONField(default=dict)
     data_out = models.JSONField(default=dict)
+    input_ports = models.JSONField(default=dict, blank=True)
+    output_ports = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
 class Edge(models.Model):
     src_node = models.ForeignKey(Node, related_name='outgoing_edges', on_delete=models.CASCADE)
@@ -15,10 +18,42 @@ class Edge(models.Model):
 class Graph(models.Model):
     nodes = models.ManyToManyField(Node)
     edges = models.ManyToManyField(Edge)
+    # Bumped on every change to the graph, its nodes or its edges (see signals.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
 class RunConfig(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+        ('timed_out', 'Timed out'),
+    ]
+
     graph = models.ForeignKey(Graph, on_delete=models.CASCADE)
     root_inputs = models.JSONField()
     data_overwrites = models.JSONField(null=True, blank=True)
     enable_list = models.JSONField(default=list)
     disable_list = models.JSONField(default=list)
+    # Also enable every ancestor of the nodes in enable_list
+    include_dependencies = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    # Seconds the run / each node may take; RUN_TIMEOUT and RUN_NODE_TIMEOUT when unset
+    timeout = models.FloatField(null=True, blank=True)
+    node_timeout = models.FloatField(null=True, blank=True)
+
+class RunRecord(models.Model):
+    """Node data produced by a run. Checkpoints store the full data of every
+    node; other records store only the differences to their checkpoint."""
+    run = models.OneToOneField(RunConfig, related_name='record', on_delete=models.CASCADE)
+    graph = models.ForeignKey(Graph, related_name='run_records', on_delete=models.CASCADE)
+    graph_version = models.PositiveIntegerField()
+    checkpoint = models.ForeignKey('self', null=True, blank=True, related_name='deltas', on_delete=models.RESTRICT)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def is_checkpoint(self):
+        return self.checkpoint_id is None
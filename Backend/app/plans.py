@@ -0,0 +1,96 @@
+# myapp/plans.py
+import threading
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .graph_execution import DAG, CompiledGraph
+from .metrics import Gauge, cache_lookup, registry
+
+def build_dag(graph, run_config=None):
+    """Build a DAG from a stored graph, applying the root inputs, overwrites
+    and enable/disable lists of run_config when given."""
+    nodes = graph.nodes.all()
+    edges = graph.edges.select_related('src_node', 'dst_node')
+    return assemble_dag(nodes, edges, run_config, enabled_node_ids(graph, run_config))
+
+async def abuild_dag(graph, run_config=None):
+    """build_dag() for async views."""
+    enabled = await sync_to_async(enabled_node_ids)(graph, run_config)
+    nodes = [node async for node in graph.nodes.all()]
+    edges = [edge async for edge in graph.edges.select_related('src_node', 'dst_node')]
+    return assemble_dag(nodes, edges, run_config, enabled)
+
+def enabled_node_ids(graph, run_config):
+    """The nodes run_config enables, or None when it has no enable_list. With
+    include_dependencies the ancestors come from the compiled plan's index."""
+    if run_config is None or not run_config.enable_list:
+        return None
+    if run_config.include_dependencies:
+        return get_compiled_graph(graph).reachability.with_ancestors(run_config.enable_list)
+    return set(run_config.enable_list)
+
+def assemble_dag(nodes, edges, run_config=None, enabled=None):
+    disabled = set(run_config.disable_list or []) if run_config is not None else set()
+
+    def is_enabled(node_id):
+        return (enabled is None or node_id in enabled) and node_id not in disabled
+
+    dag = DAG()
+    for node in nodes:
+        if not is_enabled(node.node_id):
+            continue
+        dag_node = dag.add_node(node.node_id)
+        dag_node.data_out.update(node.data_out)
+        dag_node.input_ports.update(node.input_ports)
+        dag_node.output_ports.update(node.output_ports)
+
+    for edge in edges:
+        if is_enabled(edge.src_node.node_id) and is_enabled(edge.dst_node.node_id):
+            dag.add_edge(edge.src_node.node_id, edge.dst_node.node_id, edge.src_to_dst_data_keys)
+
+    if run_config is not None:
+        for overrides in (run_config.root_inputs, run_config.data_overwrites or {}):
+            for node_id, data in overrides.items():
+                if node_id in dag.nodes:
+                    dag.nodes[node_id].data_out.update(data)
+    return dag
+
+class PlanCache:
+    """LRU cache of compiled graphs keyed by (graph id, graph version), so a
+    graph is only compiled again after it has been modified."""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._plans: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, graph) -> CompiledGraph:
+        key = (graph.pk, graph.version)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                cache_lookup('plan', hit=True)
+                return plan
+        cache_lookup('plan', hit=False)
+        plan = build_dag(graph).compile()
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def discard(self, graph_id):
+        with self._lock:
+            for key in [key for key in self._plans if key[0] == graph_id]:
+                del self._plans[key]
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+plan_cache = PlanCache(getattr(settings, 'PLAN_CACHE_SIZE', 128))
+registry.register(Gauge('kiwiq_plan_cache_entries', 'Compiled graphs held in the plan cache.',
+                        lambda: len(plan_cache._plans)))
+
+def get_compiled_graph(graph) -> CompiledGraph:
+    return plan_cache.get(graph)
@@ -0,0 +1,205 @@
+# myapp/scheduling.py
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from django.conf import settings
+from .graph_execution import CancelToken
+from .metrics import Gauge, registry
+
+DEFAULT_ADMISSION = {
+    'MAX_CONCURRENT_RUNS': 4,
+    'MAX_CONCURRENT_RUNS_PER_GRAPH': 2,
+    'MAX_QUEUED_RUNS': 32,
+    # Total estimated cost of queued and running runs
+    'MAX_PENDING_COST': 1_000_000,
+    # Seconds a run may wait for a slot before it is rejected
+    'MAX_QUEUE_WAIT': 5.0,
+}
+
+def admission_settings():
+    return {**DEFAULT_ADMISSION, **getattr(settings, 'RUN_ADMISSION', {})}
+
+def estimate_cost(compiled, run_config) -> float:
+    """Estimated work of a run: enabled nodes plus the edges and data keys
+    between them, scaled by the share of the graph that is enabled."""
+    node_count = compiled.node_count
+    if not node_count:
+        return 1.0
+    if run_config.enable_list:
+        enabled_ids = set(run_config.enable_list)
+        if run_config.include_dependencies:
+            enabled_ids = compiled.reachability.with_ancestors(enabled_ids)
+        enabled = min(len(enabled_ids), node_count)
+    else:
+        enabled = max(node_count - len(set(run_config.disable_list or [])), 0)
+    share = enabled / node_count
+    return 1.0 + enabled + share * (compiled.edge_count + compiled.key_fanout)
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+class RunTooCostly(AdmissionRejected):
+    """The run alone exceeds the pending cost budget, so retrying cannot help."""
+    def __init__(self, reason):
+        super().__init__(reason, retry_after=None)
+
+@dataclass
+class Ticket:
+    graph_id: int
+    cost: float
+    seq: int
+    started: bool = False
+    start_time: float = field(default=0.0)
+
+class AdmissionController:
+    """Bounded admission for graph runs.
+
+    Runs are limited globally and per graph. Runs that cannot start at once
+    wait in a queue served shortest-estimated-job-first; when the queue or the
+    pending cost budget is full, or a run waits longer than MAX_QUEUE_WAIT, it
+    is rejected with a Retry-After hint instead of piling up.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._running_per_graph = {}
+        self._running = 0
+        self._pending_cost = 0.0
+        self._seq = itertools.count()
+        # Exponential moving average of run durations, for Retry-After hints
+        self._avg_duration = 1.0
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    @property
+    def active_runs(self):
+        return self._running
+
+    def _can_start(self, ticket, limits):
+        return (
+            self._running < limits['MAX_CONCURRENT_RUNS']
+            and self._running_per_graph.get(ticket.graph_id, 0) < limits['MAX_CONCURRENT_RUNS_PER_GRAPH']
+        )
+
+    def _next_ticket(self, limits):
+        eligible = [ticket for ticket in self._waiting if self._can_start(ticket, limits)]
+        return min(eligible, key=lambda ticket: (ticket.cost, ticket.seq), default=None)
+
+    def _retry_after(self, limits):
+        waves = (len(self._waiting) + self._running) / max(limits['MAX_CONCURRENT_RUNS'], 1)
+        return max(1, math.ceil(waves * self._avg_duration))
+
+    def acquire(self, graph_id, cost) -> Ticket:
+        limits = admission_settings()
+        if cost > limits['MAX_PENDING_COST']:
+            raise RunTooCostly(
+                f"Estimated run cost {cost:g} exceeds the run cost budget of {limits['MAX_PENDING_COST']:g}.")
+        with self._condition:
+            if len(self._waiting) >= limits['MAX_QUEUED_RUNS']:
+                raise AdmissionRejected('Run queue is full.', self._retry_after(limits))
+            if self._pending_cost + cost > limits['MAX_PENDING_COST']:
+                raise AdmissionRejected('Run cost budget is exhausted.', self._retry_after(limits))
+
+            ticket = Ticket(graph_id=graph_id, cost=cost, seq=next(self._seq))
+            self._waiting.append(ticket)
+            self._pending_cost += cost
+            deadline = time.monotonic() + limits['MAX_QUEUE_WAIT']
+            while self._next_ticket(limits) is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._pending_cost -= cost
+                    self._condition.notify_all()
+                    raise AdmissionRejected('Timed out waiting for a run slot.', self._retry_after(limits))
+                self._condition.wait(remaining)
+
+            self._waiting.remove(ticket)
+            self._running += 1
+            self._running_per_graph[ticket.graph_id] = self._running_per_graph.get(ticket.graph_id, 0) + 1
+            ticket.started = True
+            ticket.start_time = time.monotonic()
+            # Several slots may have freed up at once; let the next waiter look
+            self._condition.notify_all()
+            return ticket
+
+    def release(self, ticket):
+        with self._condition:
+            if not ticket.started:
+                return
+            ticket.started = False
+            self._running -= 1
+            self._pending_cost -= ticket.cost
+            remaining = self._running_per_graph[ticket.graph_id] - 1
+            if remaining:
+                self._running_per_graph[ticket.graph_id] = remaining
+            else:
+                del self._running_per_graph[ticket.graph_id]
+            duration = time.monotonic() - ticket.start_time
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, graph_id, cost):
+        ticket = self.acquire(graph_id, cost)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+admission = AdmissionController()
+
+def run_token(run_config) -> CancelToken:
+    """Cancel token carrying the run's deadline and per-node timeout."""
+    timeout = run_config.timeout or getattr(settings, 'RUN_TIMEOUT', None)
+    return CancelToken(
+        deadline=time.monotonic() + timeout if timeout else None,
+        node_timeout=run_config.node_timeout or getattr(settings, 'RUN_NODE_TIMEOUT', None),
+    )
+
+class InFlightRuns:
+    """Cancel tokens of the executions running in this process, by run id.
+    A run may execute several times at once (e.g. concurrent streams), so
+    each execution registers and unregisters its own token."""
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def register(self, run_id, token):
+        with self._lock:
+            self._tokens.setdefault(run_id, set()).add(token)
+
+    def unregister(self, run_id, token):
+        with self._lock:
+            tokens = self._tokens.get(run_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens[run_id]
+
+    def cancel(self, run_id) -> bool:
+        """Cancel every execution of run_id; False if none is in flight."""
+        with self._lock:
+            tokens = list(self._tokens.get(run_id, ()))
+        for token in tokens:
+            token.cancel()
+        return bool(tokens)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(tokens) for tokens in self._tokens.values())
+
+in_flight = InFlightRuns()
+
+registry.register(Gauge('kiwiq_admission_queue_depth', 'Runs waiting for an admission slot.',
+                        lambda: admission.queue_depth))
+registry.register(Gauge('kiwiq_active_runs', 'Runs holding an admission slot.',
+                        lambda: admission.active_runs))
+registry.register(Gauge('kiwiq_in_flight_runs', 'Cancellable runs executing in this process.',
+                        lambda: len(in_flight)))
@@ -1,12 +1,30 @@
 # myapp/serializers.py
+from django.conf import settings
 from rest_framework import serializers
+from .graph_execution import PORT_TYPES
 from .models import Node, Edge, Graph, RunConfig
+from .plans import get_compiled_graph
 
 class NodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Node
         fields = '__all__'
 
+    def _validate_ports(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected a mapping of data keys to type names.")
+        for key, port_type in value.items():
+            if port_type not in PORT_TYPES:
+                raise serializers.ValidationError(
+                    f"Unknown type {port_type!r} for {key}; expected one of {', '.join(PORT_TYPES)}.")
+        return value
+
+    def validate_input_ports(self, value):
+        return self._validate_ports(value)
+
+    def validate_output_ports(self, value):
+        return self._validate_ports(value)
+
 class EdgeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Edge
@@ -24,3 +42,34 @@ class RunConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = RunConfig
         fields = '__all__'
+        read_only_fields = ['status']
+
+    def validate(self, attrs):
+        graph = attrs.get('graph') or getattr(self.instance, 'graph', None)
+        if graph is None:
+            return attrs
+        try:
+            compiled = get_compiled_graph(graph)
+        except ValueError as e:
+            raise serializers.ValidationError({'graph': str(e)})
+        for field in ('enable_list', 'disable_list'):
+            node_ids = attrs.get(field) or []
+            if not isinstance(node_ids, list):
+                raise serializers.ValidationError({field: "Expected a list of node ids."})
+            unknown = sorted({str(node_id) for node_id in node_ids
+                              if not isinstance(node_id, str) or node_id not in compiled.reachability})
+            if unknown:
+                raise serializers.ValidationError({field: f"Unknown nodes: {', '.join(unknown)}."})
+        if getattr(settings, 'VALIDATE_RUN_INPUTS', True):
+            for field in ('root_inputs', 'data_overwrites'):
+                node_data = attrs.get(field) or {}
+                if not isinstance(node_data, dict):
+                    raise serializers.ValidationError({field: "Expected a mapping of node ids to data."})
+                for node_id, data in node_data.items():
+                    if not isinstance(data, dict):
+                        raise serializers.ValidationError({field: f"Expected a mapping of data for node {node_id}."})
+                    try:
+                        compiled.ports.validate_outputs(node_id, data)
+                    except ValueError as e:
+                        raise serializers.ValidationError({field: str(e)})
+        return attrs
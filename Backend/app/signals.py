@@ -0,0 +1,44 @@
+# myapp/signals.py
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Node, Edge, Graph
+from .plans import plan_cache
+from .caching import invalidate_graphs, invalidate_node_list
+
+def bump_graph_versions(graphs):
+    graph_ids = list(graphs.values_list('pk', flat=True))
+    if graph_ids:
+        Graph.objects.filter(pk__in=graph_ids).update(version=F('version') + 1, updated_at=timezone.now())
+        invalidate_graphs(graph_ids)
+
+@receiver(post_save, sender=Node)
+@receiver(pre_delete, sender=Node)
+def node_changed(sender, instance, **kwargs):
+    bump_graph_versions(Graph.objects.filter(nodes=instance))
+    invalidate_node_list()
+
+@receiver(post_save, sender=Edge)
+@receiver(pre_delete, sender=Edge)
+def edge_changed(sender, instance, **kwargs):
+    bump_graph_versions(Graph.objects.filter(edges=instance))
+
+@receiver(post_delete, sender=Graph)
+def graph_deleted(sender, instance, **kwargs):
+    # Graph ids can be reused, so compiled plans must not outlive the graph
+    plan_cache.discard(instance.pk)
+    invalidate_graphs([instance.pk])
+
+@receiver(m2m_changed, sender=Graph.nodes.through)
+@receiver(m2m_changed, sender=Graph.edges.through)
+def graph_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_graph_versions(Graph.objects.filter(pk=instance.pk))
+    elif action == 'pre_clear':
+        relation = 'nodes' if isinstance(instance, Node) else 'edges'
+        bump_graph_versions(Graph.objects.filter(**{relation: instance}))
+    else:
+        bump_graph_versions(Graph.objects.filter(pk__in=pk_set))
@@ -1,11 +1,40 @@
 # app/tests.py
 
+import json
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.test import APITestCase
-from app.models import Node, Edge, Graph, RunConfig
+
+from app.graph_execution import DAG, CancelToken, RunCancelled, RunTimedOut
+from app.history import checkpoint_cache, diff_snapshots, apply_node_delta
+from app.metrics import Counter, Histogram, Registry, RUNS, registry
+from app.models import Node, Edge, Graph, RunConfig, RunRecord
+from app.plans import plan_cache
+from app.scheduling import AdmissionController, AdmissionRejected, RunTooCostly, admission, in_flight
 from app.serializers import NodeSerializer, EdgeSerializer, GraphSerializer, RunConfigSerializer
 
+class TwoNodeGraphMixin:
+    """Sets up graph A -> B, with A's out1 feeding B's in1."""
+    node_a_fields = {"data_out": {"out1": 1}}
+    node_b_fields = {}
+
+    def setUp(self):
+        # Test rollbacks reuse graph ids and versions, so drop cached plans
+        plan_cache.clear()
+        checkpoint_cache.clear()
+        self.node_a = Node.objects.create(node_id="A", **self.node_a_fields)
+        self.node_b = Node.objects.create(node_id="B", **self.node_b_fields)
+        self.edge = Edge.objects.create(src_node=self.node_a, dst_node=self.node_b, src_to_dst_data_keys={"out1": "in1"})
+        self.graph = Graph.objects.create()
+        self.graph.nodes.set([self.node_a, self.node_b])
+        self.graph.edges.set([self.edge])
+
 class GraphAPITestCase(APITestCase):
     def setUp(self):
         # Set up initial test data if necessary
@@ -110,3 +139,531 @@ class GraphAPITestCase(APITestCase):
         response = self.client.get(node_data_url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # Customize assertions based on expected output structure
+
+
+class ReachabilityAPITestCase(APITestCase):
+    def setUp(self):
+        plan_cache.clear()
+        self.node_a = Node.objects.create(node_id="A", data_out={"out1": 1})
+        self.node_b = Node.objects.create(node_id="B")
+        self.node_c = Node.objects.create(node_id="C")
+        self.node_d = Node.objects.create(node_id="D")
+        edge_ab = Edge.objects.create(src_node=self.node_a, dst_node=self.node_b, src_to_dst_data_keys={"out1": "in1"})
+        edge_bc = Edge.objects.create(src_node=self.node_b, dst_node=self.node_c)
+        self.graph = Graph.objects.create()
+        self.graph.nodes.set([self.node_a, self.node_b, self.node_c, self.node_d])
+        self.graph.edges.set([edge_ab, edge_bc])
+
+    def test_ancestors_and_descendants(self):
+        """Test the transitive closure of a node"""
+        url = reverse('graph-reachability', args=[self.graph.id])
+        response = self.client.get(url, {"node": "B"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ancestors'], ["A"])
+        self.assertEqual(response.data['descendants'], ["C"])
+
+    def test_reaches(self):
+        """Test point reachability queries between two nodes"""
+        url = reverse('graph-reachability', args=[self.graph.id])
+        response = self.client.get(url, {"node": "A", "target": "C"})
+        self.assertTrue(response.data['reaches'])
+        response = self.client.get(url, {"node": "A", "target": "D"})
+        self.assertFalse(response.data['reaches'])
+
+    def test_unknown_node(self):
+        """Test querying a node that is not part of the graph"""
+        url = reverse('graph-reachability', args=[self.graph.id])
+        response = self.client.get(url, {"node": "Z"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_cached_per_version(self):
+        """Test that the index is built once per graph version"""
+        url = reverse('graph-reachability', args=[self.graph.id])
+        self.client.get(url, {"node": "B"})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"node": "B"})
+        self.assertEqual(response.data['descendants'], ["C"])
+        edge_cd = Edge.objects.create(src_node=self.node_c, dst_node=self.node_d)
+        self.graph.edges.add(edge_cd)
+        response = self.client.get(url, {"node": "B"})
+        self.assertEqual(response.data['descendants'], ["C", "D"])
+
+    def test_run_includes_dependencies(self):
+        """Test that include_dependencies enables the ancestors of enable_list"""
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {
+            "graph": self.graph.id, "root_inputs": {}, "enable_list": ["C"], "include_dependencies": True,
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        record = RunRecord.objects.get(run_id=response.data['id'])
+        self.assertEqual(set(record.payload), {"A", "B", "C"})
+        self.assertEqual(record.payload["B"]["data_in"], {"in1": 1})
+
+    def test_run_rejects_unknown_enabled_nodes(self):
+        """Test that enable_list and disable_list may only name nodes of the graph"""
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {}, "enable_list": ["A", "Z"]},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('enable_list', response.data)
+
+
+class RunStreamAPITestCase(APITestCase):
+    def setUp(self):
+        plan_cache.clear()
+        node_a = Node.objects.create(node_id="A", data_out={"out1": 1})
+        node_b = Node.objects.create(node_id="B", data_out={"out2": 2})
+        node_c = Node.objects.create(node_id="C")
+        edge_ab = Edge.objects.create(src_node=node_a, dst_node=node_b, src_to_dst_data_keys={"out1": "in1"})
+        edge_bc = Edge.objects.create(src_node=node_b, dst_node=node_c, src_to_dst_data_keys={"out2": "in2"})
+        self.graph = Graph.objects.create()
+        self.graph.nodes.set([node_a, node_b, node_c])
+        self.graph.edges.set([edge_ab, edge_bc])
+        self.run_config = RunConfig.objects.create(
+            graph=self.graph,
+            root_inputs={"A": {"out1": 42}},
+            data_overwrites={"B": {"out2": 84}},
+        )
+
+    def test_stream_ndjson(self):
+        """Test streaming run results one level per line"""
+        url = reverse('runconfig-stream', args=[self.run_config.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([line.get('level') for line in lines], [0, 1, 2, None])
+        self.assertEqual(lines[1]['nodes']['B']['data_in'], {"in1": 42})
+        self.assertEqual(lines[2]['nodes']['C']['data_in'], {"in2": 84})
+        self.assertTrue(lines[-1]['done'])
+        self.assertEqual(admission.active_runs, 0)
+
+    def test_stream_sse(self):
+        """Test streaming run results as server-sent events"""
+        url = reverse('runconfig-stream', args=[self.run_config.id])
+        response = self.client.get(url, {"transport": "sse"})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('event: level'), 3)
+        self.assertTrue(body.endswith('\n\n'))
+
+    def test_stalled_stream_releases_slot(self):
+        """Test that a client that stops reading does not hold an admission slot"""
+        url = reverse('runconfig-stream', args=[self.run_config.id])
+        response = self.client.get(url)
+        deadline = time.monotonic() + 5
+        while admission.active_runs and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(admission.active_runs, 0)
+        self.assertEqual(len(in_flight), 0)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertTrue(json.loads(lines[-1])['done'])
+
+
+class PortSchemaAPITestCase(TwoNodeGraphMixin, APITestCase):
+    node_a_fields = {"output_ports": {"out1": "int"}}
+    node_b_fields = {"input_ports": {"in1": "float"}}
+
+    def test_unknown_port_type(self):
+        """Test that nodes only declare known port types"""
+        url = reverse('node-list')
+        response = self.client.post(url, {"node_id": "C", "input_ports": {"in1": "decimal"}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_run_validates_root_inputs(self):
+        """Test that root inputs are checked against the declared output ports"""
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {"A": {"out1": 3}}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {"A": {"out1": "3"}}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("expected int, got str", str(response.data['root_inputs']))
+
+    def test_run_rejects_non_mapping_inputs(self):
+        """Test that root inputs and overwrites must map node ids to data"""
+        for field in ('root_inputs', 'data_overwrites'):
+            for url in (reverse('runconfig-list'), reverse('async-run-create')):
+                data = {"graph": self.graph.id, "root_inputs": {}, field: [1]}
+                response = self.client.post(url, data, format="json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("Expected a mapping of node ids to data.", str(response.json()[field]))
+
+    def test_incompatible_edge_ports(self):
+        """Test that edges are checked against the port schemas when the graph is recompiled"""
+        self.node_b.input_ports = {"in1": "str"}
+        self.node_b.save()
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Incompatible data types for out1 -> in1", str(response.data['graph']))
+
+    def test_version_bumped_on_changes(self):
+        """Test that the graph version changes with its nodes and edges"""
+        version = Graph.objects.get(pk=self.graph.pk).version
+        self.node_a.data_out = {"out1": 1}
+        self.node_a.save()
+        self.assertEqual(Graph.objects.get(pk=self.graph.pk).version, version + 1)
+        self.edge.delete()
+        self.assertEqual(Graph.objects.get(pk=self.graph.pk).version, version + 2)
+
+
+class RunHistoryAPITestCase(APITestCase):
+    def setUp(self):
+        plan_cache.clear()
+        checkpoint_cache.clear()
+        nodes = [Node.objects.create(node_id=f"N{i}", data_out={"out": i}) for i in range(6)]
+        edges = [
+            Edge.objects.create(src_node=src, dst_node=dst, src_to_dst_data_keys={"out": "in"})
+            for src, dst in zip(nodes, nodes[1:])
+        ]
+        self.graph = Graph.objects.create()
+        self.graph.nodes.set(nodes)
+        self.graph.edges.set(edges)
+
+    def create_run(self, root_inputs):
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": root_inputs}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return RunConfig.objects.get(pk=response.data['id'])
+
+    def test_runs_stored_as_deltas(self):
+        """Test that only the first run of a graph version stores full node data"""
+        first = self.create_run({})
+        second = self.create_run({"N0": {"out": 100}})
+        self.assertTrue(first.record.is_checkpoint)
+        self.assertEqual(second.record.checkpoint_id, first.record.pk)
+        self.assertEqual(set(second.record.payload), {"N0", "N1"})
+
+    def test_reconstruct_node_data(self):
+        """Test rebuilding a node's data for past runs"""
+        first = self.create_run({})
+        second = self.create_run({"N0": {"out": 100}})
+        url = reverse('runconfig-node-data', args=[second.id, "N1"])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data_in'], {"in": 100})
+        url = reverse('runconfig-node-data', args=[first.id, "N1"])
+        self.assertEqual(self.client.get(url).data['data_in'], {"in": 0})
+        url = reverse('runconfig-node-data', args=[second.id, "N9"])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_graph_with_history(self):
+        """Test that a graph can be deleted together with its run history"""
+        self.create_run({})
+        self.create_run({"N0": {"out": 100}})
+        response = self.client.delete(reverse('graph-detail', args=[self.graph.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(RunRecord.objects.exists())
+
+    def test_delete_checkpoint_run(self):
+        """Test that deleting a checkpoint run keeps the runs stored against it readable"""
+        first = self.create_run({})
+        second = self.create_run({"N0": {"out": 100}})
+        third = self.create_run({"N0": {"out": 200}})
+        response = self.client.delete(reverse('runconfig-detail', args=[first.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        second.record.refresh_from_db()
+        third.record.refresh_from_db()
+        self.assertTrue(second.record.is_checkpoint)
+        self.assertEqual(third.record.checkpoint_id, second.record.pk)
+        for run, value in ((second, 100), (third, 200)):
+            url = reverse('runconfig-node-data', args=[run.id, "N1"])
+            self.assertEqual(self.client.get(url).data['data_in'], {"in": value})
+        url = reverse('runconfig-node-data', args=[third.id, "N0"])
+        self.assertEqual(self.client.get(url).data['data_out'], {"out": 200})
+
+    def test_delta_round_trip(self):
+        """Test that applying a delta restores the snapshot it was computed from"""
+        base = {"A": {"data_in": {"x": 1, "y": 2}, "data_out": {}}, "B": {"data_in": {}, "data_out": {"z": 1}}}
+        new = {"A": {"data_in": {"x": 1, "w": 3}, "data_out": {}}, "C": {"data_in": {}, "data_out": {"v": 1}}}
+        delta = diff_snapshots(base, new)
+        self.assertIsNone(delta["B"])
+        for node_id in new:
+            self.assertEqual(apply_node_delta(base.get(node_id), delta[node_id]), new[node_id])
+
+
+@override_settings(QUERY_COUNT_HEADER=True)
+class QueryCountHeaderTestCase(APITestCase):
+    def test_query_count_header(self):
+        """Test that responses report the number of queries they ran"""
+        response = self.client.get(reverse('edge-list'))
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+
+
+class AsyncRunAPITestCase(TwoNodeGraphMixin, APITestCase):
+    async def test_create_run_and_read_result(self):
+        """Test creating a run and reading its node data through the async views"""
+        response = await self.async_client.post(
+            reverse('async-run-create'),
+            {"graph": self.graph.id, "root_inputs": {"A": {"out1": 42}}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_id = response.json()['id']
+        response = await self.async_client.get(reverse('async-run-node-data', args=[run_id, "B"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data_in'], {"in1": 42})
+
+    async def test_create_run_invalid(self):
+        """Test that invalid run configs are rejected"""
+        response = await self.async_client.post(
+            reverse('async-run-create'), {"root_inputs": {}}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('graph', response.json())
+
+
+class ConditionalGetTestCase(TwoNodeGraphMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_graph_not_modified(self):
+        """Test that polling an unchanged graph answers 304 after one query"""
+        url = reverse('graph-detail', args=[self.graph.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_graph_cached_until_modified(self):
+        """Test that graph reads are served from the cache until a node changes"""
+        url = reverse('graph-detail', args=[self.graph.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url)['ETag'], etag)
+        self.node_a.data_out = {"out1": 2}
+        self.node_a.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['nodes'][0]['data_out'], {"out1": 2})
+
+    def test_graph_invalid_pk(self):
+        """Test that a malformed or unknown graph id answers 404"""
+        self.assertEqual(self.client.get('/api/graphs/abc/').status_code, status.HTTP_404_NOT_FOUND)
+        url = reverse('graph-detail', args=[self.graph.id + 1000])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_node_list_not_modified(self):
+        """Test conditional requests on the node list"""
+        url = reverse('node-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.node_b.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_if_modified_since_ignored(self):
+        """Test that a deletion is not hidden from clients sending only If-Modified-Since"""
+        url = reverse('node-list')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.node_a.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        url = reverse('graph-detail', args=[self.graph.id])
+        self.assertNotIn('Last-Modified', self.client.get(url))
+
+
+class AdmissionControllerTestCase(SimpleTestCase):
+    @override_settings(RUN_ADMISSION={'MAX_CONCURRENT_RUNS': 1, 'MAX_QUEUE_WAIT': 5.0})
+    def test_shortest_job_first(self):
+        """Test that the cheapest queued run starts first once a slot frees up"""
+        controller = AdmissionController()
+        running = controller.acquire(graph_id=1, cost=100)
+        started = []
+
+        def run(cost):
+            with controller.admit(graph_id=2, cost=cost):
+                started.append(cost)
+
+        threads = []
+        for cost in (50, 10):
+            threads.append(threading.Thread(target=run, args=(cost,)))
+            threads[-1].start()
+            while controller.queue_depth < len(threads):
+                time.sleep(0.001)
+        controller.release(running)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(started, [10, 50])
+
+    @override_settings(RUN_ADMISSION={'MAX_CONCURRENT_RUNS': 2, 'MAX_QUEUE_WAIT': 2.0})
+    def test_waiters_start_when_slots_free_together(self):
+        """Test that two queued runs both start when two slots free up at once"""
+        def run(controller, graph_id, cost, waited):
+            started = time.monotonic()
+            controller.acquire(graph_id=graph_id, cost=cost)
+            waited.append(time.monotonic() - started)
+
+        # The costlier run queues first, so it is usually woken first, finds the
+        # cheaper run ahead of it and must be woken again once that one starts.
+        # Wake-up order is up to the OS, hence the repetitions.
+        for _ in range(5):
+            controller = AdmissionController()
+            running = [controller.acquire(graph_id=1, cost=1), controller.acquire(graph_id=2, cost=1)]
+            waited = []
+            threads = []
+            for graph_id, cost in ((3, 50), (4, 10)):
+                threads.append(threading.Thread(target=run, args=(controller, graph_id, cost, waited)))
+                threads[-1].start()
+                while controller.queue_depth < len(threads):
+                    time.sleep(0.001)
+            with controller._condition:
+                for ticket in running:
+                    controller.release(ticket)
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(waited), 2)
+            self.assertLess(max(waited), 1.0)
+
+    @override_settings(RUN_ADMISSION={'MAX_CONCURRENT_RUNS_PER_GRAPH': 1, 'MAX_QUEUE_WAIT': 0.01})
+    def test_per_graph_limit(self):
+        """Test that a graph cannot take more than its share of run slots"""
+        controller = AdmissionController()
+        controller.acquire(graph_id=1, cost=1)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.acquire(graph_id=1, cost=1)
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        controller.acquire(graph_id=2, cost=1)
+        self.assertEqual(controller.active_runs, 2)
+        self.assertEqual(controller.queue_depth, 0)
+
+
+class RunAdmissionAPITestCase(TwoNodeGraphMixin, APITestCase):
+    @override_settings(RUN_ADMISSION={'MAX_PENDING_COST': 10})
+    def test_run_over_budget_rejected(self):
+        """Test that runs over the pending cost budget are rejected with 429 and Retry-After"""
+        ticket = admission.acquire(graph_id=0, cost=8)
+        try:
+            url = reverse('runconfig-list')
+            response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {}}, format="json")
+        finally:
+            admission.release(ticket)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(RunConfig.objects.count(), 0)
+
+    @override_settings(RUN_ADMISSION={'MAX_PENDING_COST': 2})
+    def test_run_costlier_than_budget_rejected(self):
+        """Test that a run that can never fit the cost budget is rejected with 422"""
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertNotIn('Retry-After', response)
+        self.assertEqual(RunConfig.objects.count(), 0)
+        with self.assertRaises(RunTooCostly):
+            AdmissionController().acquire(graph_id=self.graph.id, cost=3)
+
+
+class RunCancellationTestCase(TwoNodeGraphMixin, APITestCase):
+    def test_cancelled_token_stops_data_flow(self):
+        """Test that a cancelled token stops the run before any node is processed"""
+        dag = DAG()
+        dag.add_node("A").data_out["out1"] = 1
+        dag.add_node("B")
+        dag.add_edge("A", "B", {"out1": "in1"})
+        token = CancelToken()
+        token.cancel()
+        with self.assertRaises(RunCancelled):
+            dag.process_data_flow(token)
+        self.assertEqual(dag.nodes["B"].data_in, {})
+        with self.assertRaises(RunTimedOut):
+            dag.process_data_flow(CancelToken(deadline=time.monotonic() - 1))
+
+    def test_successful_run_status(self):
+        """Test that a finished run is marked succeeded"""
+        response = self.client.post(reverse('runconfig-list'), {"graph": self.graph.id, "root_inputs": {}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(RunConfig.objects.get().status, 'succeeded')
+
+    def test_run_timeout(self):
+        """Test that a run over its timeout is marked timed_out and returns 504"""
+        url = reverse('runconfig-list')
+        response = self.client.post(url, {"graph": self.graph.id, "root_inputs": {}, "timeout": 1e-9}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+        self.assertEqual(RunConfig.objects.get().status, 'timed_out')
+        self.assertEqual(len(in_flight), 0)
+        self.assertEqual(admission.active_runs, 0)
+
+    def test_cancel_run_not_in_flight(self):
+        """Test that cancelling a finished run is a conflict"""
+        run_config = RunConfig.objects.create(graph=self.graph, root_inputs={}, status='succeeded')
+        response = self.client.post(reverse('runconfig-cancel', args=[run_config.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cancel_run_in_flight(self):
+        """Test that cancelling an in-flight run trips its token"""
+        run_config = RunConfig.objects.create(graph=self.graph, root_inputs={}, status='running')
+        token = CancelToken()
+        in_flight.register(run_config.id, token)
+        try:
+            response = self.client.post(reverse('runconfig-cancel', args=[run_config.id]))
+        finally:
+            in_flight.unregister(run_config.id, token)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(token.cancelled)
+
+    def test_concurrent_executions_tracked_separately(self):
+        """Test that finishing one execution of a run keeps the others cancellable"""
+        first, second = CancelToken(), CancelToken()
+        in_flight.register(1, first)
+        in_flight.register(1, second)
+        self.assertEqual(len(in_flight), 2)
+        in_flight.unregister(1, first)
+        self.assertTrue(in_flight.cancel(1))
+        self.assertTrue(second.cancelled)
+        self.assertFalse(first.cancelled)
+        in_flight.unregister(1, second)
+        self.assertFalse(in_flight.cancel(1))
+        self.assertEqual(len(in_flight), 0)
+
+
+class MetricsRenderTestCase(SimpleTestCase):
+    def test_render_counter_and_histogram(self):
+        """Test the Prometheus text format of counters and histograms"""
+        metrics = Registry()
+        runs = metrics.register(Counter('runs_total', 'Runs.', labels=('outcome',)))
+        latency = metrics.register(Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1)))
+        runs.inc(outcome='succeeded')
+        runs.inc(outcome='succeeded')
+        latency.observe(0.5)
+        text = metrics.render()
+        self.assertIn('# TYPE runs_total counter\nruns_total{outcome="succeeded"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn('latency_seconds_count 1\n', text)
+
+
+class MetricsEndpointTestCase(TwoNodeGraphMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def test_metrics_after_run(self):
+        """Test that /metrics reports run outcomes, phases, caches and graph sizes"""
+        url = reverse('runconfig-list')
+        self.client.post(url, {"graph": self.graph.id, "root_inputs": {}}, format="json")
+        self.client.post(url, {"graph": self.graph.id, "root_inputs": {}, "timeout": 1e-9}, format="json")
+        self.assertEqual(RUNS.value(outcome='succeeded'), 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('kiwiq_runs_total{outcome="succeeded"} 1\n', text)
+        self.assertIn('kiwiq_runs_total{outcome="timed_out"} 1\n', text)
+        self.assertIn('kiwiq_run_phase_seconds_count{phase="execute"} 2\n', text)
+        self.assertIn('kiwiq_graph_nodes_bucket{le="5"} 2\n', text)
+        self.assertIn('kiwiq_cache_hit_ratio{cache="plan"} 0.75\n', text)
+        self.assertIn('kiwiq_admission_queue_depth 0\n', text)
+        self.assertIn('kiwiq_active_runs 0\n', text)
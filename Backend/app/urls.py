@@ -3,6 +3,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import GraphViewSet, RunConfigViewSet, NodeViewSet, EdgeViewSet
+from . import async_views
 """ EdgeViewSet """
 
 # Initialize router
@@ -12,5 +13,8 @@ router.register(r'runs', RunConfigViewSet, basename='runconfig') # Run config en
 router.register(r'nodes', NodeViewSet, basename='node')          # Node endpoints
 router.register(r'edges', EdgeViewSet, basename='edge')          # Edge endpoints
 
-# Define URL patterns with only the router included
-urlpatterns = router.urls
+# Router URLs plus the async run endpoints served best through ASGI
+urlpatterns = router.urls + [
+    path('async/runs/', async_views.create_run, name='async-run-create'),
+    path('async/runs/<int:pk>/nodes/<str:node_id>/', async_views.run_node_data, name='async-run-node-data'),
+]
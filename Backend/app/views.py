@@ -1,31 +1,252 @@
 # myapp/views.py
-from rest_framework import viewsets
+import json
+import queue
+import threading
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from django.db import transaction
+from django.db.models import Count, Max
+from rest_framework.exceptions import APIException, NotFound, Throttled, ValidationError
 from rest_framework.response import Response
-from .models import Graph, Node, Edge, RunConfig
+from .models import Graph, Node, Edge, RunConfig, RunRecord
 from .serializers import GraphSerializer, NodeSerializer, EdgeSerializer, RunConfigSerializer
-from .graph_execution import DAG
+from .plans import build_dag, get_compiled_graph
+from .history import promote_checkpoint_successor, record_run, reconstruct_node_data
+from .scheduling import AdmissionRejected, RunTooCostly, admission, estimate_cost, in_flight, run_token
+from .graph_execution import RunCancelled, RunTimedOut
+from .metrics import CONTENT_TYPE, RUN_PHASE_SECONDS, RUNS, registry
+from .caching import (
+    NODE_LIST_KEY, conditional_response, get_cached, graph_etag, graph_response_key,
+    node_list_etag, set_cached, set_validators,
+)
+
+def admit_run(run_config):
+    """Wait for an admission slot for run_config, or raise Throttled (429)."""
+    try:
+        compiled = get_compiled_graph(run_config.graph)
+    except ValueError as e:
+        raise ValidationError({'graph': str(e)})
+    try:
+        with RUN_PHASE_SECONDS.time(phase='admission'):
+            return admission.acquire(run_config.graph.pk, estimate_cost(compiled, run_config))
+    except RunTooCostly as e:
+        RUNS.inc(outcome='rejected')
+        raise RunTooCostlyError(str(e))
+    except AdmissionRejected as e:
+        RUNS.inc(outcome='rejected')
+        raise Throttled(wait=e.retry_after, detail=str(e))
+
+class RunTooCostlyError(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Run exceeds the run cost budget.'
+
+class RunCancelledError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Run was cancelled.'
+
+class RunTimedOutError(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = 'Run timed out.'
+
+class ReleasingStream:
+    """Streaming content that runs on_close when the response is closed,
+    even if it was never iterated."""
+    def __init__(self, events, on_close):
+        self.events = events
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        self.on_close()
 
 class GraphViewSet(viewsets.ModelViewSet):
     queryset = Graph.objects.all()
     serializer_class = GraphSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """Serve unchanged graphs with a single version lookup: 304 when the
+        client's ETag still matches, else the cached serialization."""
+        queryset = self.filter_queryset(self.get_queryset()).only('pk', 'version')
+        try:
+            state = queryset.get(pk=kwargs['pk'])
+        except (Graph.DoesNotExist, ValueError, TypeError):
+            raise NotFound()
+        self.check_object_permissions(request, state)
+        version = state.version
+        etag = graph_etag(state.pk, version)
+        response = conditional_response(request, etag)
+        if response is not None:
+            return response
+
+        key = graph_response_key(state.pk)
+        data = get_cached(key, version)
+        if data is None:
+            graph = self.get_object()
+            data = self.get_serializer(graph).data
+            set_cached(key, graph.version, data)
+            etag = graph_etag(graph.pk, graph.version)
+        return set_validators(Response(data), etag)
+
+    @action(detail=True, methods=['get'])
+    def reachability(self, request, pk=None):
+        node_id = request.query_params.get('node')
+        if not node_id:
+            raise ValidationError({'node': 'This query parameter is required.'})
+        target = request.query_params.get('target')
+        try:
+            # Built once per graph version along with the compiled plan
+            index = get_compiled_graph(self.get_object()).reachability
+            data = {
+                'node': node_id,
+                'ancestors': sorted(index.ancestors(node_id)),
+                'descendants': sorted(index.descendants(node_id)),
+            }
+            if target:
+                data['target'] = target
+                data['reaches'] = index.reaches(node_id, target)
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        return Response(data)
+
 class RunConfigViewSet(viewsets.ModelViewSet):
     queryset = RunConfig.objects.all()
     serializer_class = RunConfigSerializer
 
     def perform_create(self, serializer):
-        graph = serializer.validated_data['graph']
-        dag = DAG()
-        for node in graph.nodes.all():
-            dag.add_node(node.node_id)
-            node_data_out = json.loads(node.data_out)
-            dag.nodes[node.node_id].data_out.update(node_data_out)
+        ticket = admit_run(RunConfig(**serializer.validated_data))
+        try:
+            run_config = serializer.save(status='running')
+            token = run_token(run_config)
+            in_flight.register(run_config.pk, token)
+            try:
+                with RUN_PHASE_SECONDS.time(phase='build'):
+                    dag = build_dag(run_config.graph, run_config)
+                dag.process_data_flow(token)
+            except RunCancelled as e:
+                # The partial results are dropped here, along with the slot
+                run_config.status = 'timed_out' if isinstance(e, RunTimedOut) else 'cancelled'
+                run_config.save(update_fields=['status'])
+                RUNS.inc(outcome=run_config.status)
+                error = RunTimedOutError if isinstance(e, RunTimedOut) else RunCancelledError
+                raise error(f'Run {run_config.pk}: {e}')
+            except Exception:
+                run_config.status = 'failed'
+                run_config.save(update_fields=['status'])
+                RUNS.inc(outcome='failed')
+                raise
+            finally:
+                in_flight.unregister(run_config.pk, token)
+        finally:
+            admission.release(ticket)
+        with RUN_PHASE_SECONDS.time(phase='record'):
+            record_run(run_config, dag)
+        run_config.status = 'succeeded'
+        run_config.save(update_fields=['status'])
+        RUNS.inc(outcome='succeeded')
+
+    def perform_destroy(self, instance):
+        # Later runs of the graph version may be stored as deltas against this one
+        with transaction.atomic():
+            record = RunRecord.objects.filter(run=instance).first()
+            if record is not None:
+                promote_checkpoint_successor(record)
+            instance.delete()
 
-        for edge in graph.edges.all():
-            dag.add_edge(edge.src_node.node_id, edge.dst_node.node_id, edge.src_to_dst_data_keys)
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel an in-flight run; it stops at its next node boundary."""
+        run_config = self.get_object()
+        if not in_flight.cancel(run_config.pk):
+            return Response({'detail': 'Run is not in flight.'}, status=status.HTTP_409_CONFLICT)
+        return Response({'run': run_config.pk, 'status': 'cancelling'}, status=status.HTTP_202_ACCEPTED)
 
-        dag.process_data_flow()
-        serializer.save()
+    @action(detail=True, methods=['get'], url_path=r'nodes/(?P<node_id>[^/]+)')
+    def node_data(self, request, pk=None, node_id=None):
+        """Data of one node as produced by this run, rebuilt from the run history."""
+        run_config = self.get_object()
+        record = getattr(run_config, 'record', None)
+        if record is None:
+            raise NotFound('No history was recorded for this run.')
+        try:
+            data = reconstruct_node_data(record, node_id)
+        except KeyError:
+            raise NotFound(f'Node {node_id} was not part of this run.')
+        return Response({'run': run_config.pk, 'node_id': node_id, **data})
+
+    @action(detail=True, methods=['get'])
+    def stream(self, request, pk=None):
+        """Execute the run and stream each level's node data as it completes,
+        as NDJSON or, with ?transport=sse, as server-sent events."""
+        run_config = self.get_object()
+        ticket = admit_run(run_config)
+        try:
+            with RUN_PHASE_SECONDS.time(phase='build'):
+                dag = build_dag(run_config.graph, run_config)
+        except Exception:
+            admission.release(ticket)
+            RUNS.inc(outcome='failed')
+            raise
+        token = run_token(run_config)
+        in_flight.register(run_config.pk, token)
+        sse = request.query_params.get('transport') == 'sse'
+
+        def encode(event, payload):
+            if sse:
+                return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            return json.dumps(payload) + "\n"
+
+        events = queue.SimpleQueue()
+
+        def produce():
+            # Runs to the end under the admission slot whatever the client's
+            # read pace, so a stalled client neither holds the slot nor
+            # escapes the run deadline
+            try:
+                for level, nodes in dag.iter_data_flow(token):
+                    events.put(encode('level', {
+                        'level': level,
+                        'nodes': {
+                            node_id: {'data_in': node.data_in, 'data_out': node.data_out}
+                            for node_id, node in nodes.items()
+                        },
+                    }))
+            except RunCancelled as e:
+                RUNS.inc(outcome='timed_out' if isinstance(e, RunTimedOut) else 'cancelled')
+                event = 'timeout' if isinstance(e, RunTimedOut) else 'cancelled'
+                events.put(encode(event, {'run': run_config.pk, 'detail': str(e)}))
+            except Exception as e:
+                RUNS.inc(outcome='failed')
+                events.put(e)
+            else:
+                RUNS.inc(outcome='succeeded')
+                events.put(encode('done', {'run': run_config.pk, 'done': True}))
+            finally:
+                in_flight.unregister(run_config.pk, token)
+                admission.release(ticket)
+                events.put(None)
+
+        def consume():
+            while True:
+                event = events.get()
+                if event is None:
+                    return
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+
+        threading.Thread(target=produce, name=f'run-{run_config.pk}-stream', daemon=True).start()
+
+        content_type = 'text/event-stream' if sse else 'application/x-ndjson'
+        # A client that disconnects early stops the rest of the run
+        response = StreamingHttpResponse(ReleasingStream(consume(), token.cancel), content_type=content_type)
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 
 from .models import Node
@@ -34,7 +255,27 @@ from .serializers import NodeSerializer
 class NodeViewSet(viewsets.ModelViewSet):
     queryset = Node.objects.all()
     serializer_class = NodeSerializer
+
+    def list(self, request, *args, **kwargs):
+        """Conditional, cached node list validated by the node count and the
+        latest modification time."""
+        state = Node.objects.aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+        etag = node_list_etag(state['count'], state['updated_at'])
+        response = conditional_response(request, etag)
+        if response is not None:
+            return response
+
+        data = get_cached(NODE_LIST_KEY, etag)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            set_cached(NODE_LIST_KEY, etag, data)
+        return set_validators(Response(data), etag)
     
 class EdgeViewSet(viewsets.ModelViewSet):
     queryset = Edge.objects.all()
-    serializer_class = EdgeSerializer
\ No newline at end of file
+    serializer_class = EdgeSerializer
+
+@require_GET
+def metrics(request):
+    """Process metrics in the Prometheus text exposition format."""
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
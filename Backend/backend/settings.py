@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.middleware.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -75,12 +77,42 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL (as in docker-compose.yml) is used when POSTGRES_DB is set. It goes
+# through psycopg's connection pool, which Django requires instead of persistent
+# connections under ASGI. SQLite keeps health-checked persistent connections.
+if os.environ.get('POSTGRES_DB'):
+    from psycopg_pool import ConnectionPool
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'db'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                    'check': ConnectionPool.check_connection,
+                },
+            },
+        }
+    }
+else:
+    # Persistent connections only pay off under WSGI; Django must not reuse
+    # connections under ASGI, so DB_CONN_MAX_AGE stays 0 unless set for a
+    # WSGI server (runserver, gunicorn)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
 
 
 # Password validation
@@ -123,4 +155,47 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-# APPEND_SLASH = False
\ No newline at end of file
+# APPEND_SLASH = False
+# Graph execution
+
+# Number of compiled graphs (keyed by graph id and version) kept in memory
+PLAN_CACHE_SIZE = 128
+
+# Check run root inputs and overwrites against the nodes' declared output ports
+VALIDATE_RUN_INPUTS = True
+
+# Runs are stored as deltas against a checkpoint holding the full node data;
+# a new checkpoint is written at least every RUN_HISTORY_CHECKPOINT_INTERVAL runs
+RUN_HISTORY_CHECKPOINT_INTERVAL = 50
+
+# Number of decoded checkpoint payloads kept in memory for reconstruction
+RUN_HISTORY_CHECKPOINT_CACHE_SIZE = 32
+
+# Add an X-DB-Query-Count header to every response (used by the loadtest command)
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER') == '1'
+
+# Cache for serialized graph and node list responses; entries are validated
+# against the graph version / node list state on every read
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kiwiq',
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Run admission control (see app/scheduling.py). Runs beyond these limits queue
+# shortest-estimated-job-first or are rejected with 429 and Retry-After. The
+# RUN_MAX_* variables let benchmarks raise the limits of the servers they start.
+RUN_ADMISSION = {
+    'MAX_CONCURRENT_RUNS': int(os.environ.get('RUN_MAX_CONCURRENT_RUNS', 4)),
+    'MAX_CONCURRENT_RUNS_PER_GRAPH': int(os.environ.get('RUN_MAX_CONCURRENT_RUNS_PER_GRAPH', 2)),
+    'MAX_QUEUED_RUNS': int(os.environ.get('RUN_MAX_QUEUED_RUNS', 32)),
+    'MAX_PENDING_COST': 1_000_000,
+    'MAX_QUEUE_WAIT': 5.0,
+}
+
+# Default seconds a run, and each node within it, may take (None for no limit).
+# A run's own timeout/node_timeout fields take precedence.
+RUN_TIMEOUT = 300
+RUN_NODE_TIMEOUT = None
@@ -2,8 +2,10 @@
 
 from django.contrib import admin
 from django.urls import path, include
+from app.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),  # Admin route
     path('api/', include('app.urls')),  # API routes from the app `backend`
+    path('metrics', metrics, name='metrics'),  # Prometheus scrape target
 ]